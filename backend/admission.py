@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+
+from core import Automaton, as_nfa
+from determinize import LimitExceeded, determinize, subset_bound
+
+# ==============================================================================
+# ADMISSION CONTROL - size estimates up front, hard limits during construction
+# ==============================================================================
+# Inputs past MAX_NFA_STATES are refused before any work (413). Subset construction
+# stops at MAX_DFA_STATES or CONSTRUCTION_TIMEOUT (422, with how far it got). When the
+# structural bound says the DFA is small the construction runs in-process; otherwise
+# it runs in a child process that is killed CONSTRUCTION_KILL_GRACE seconds past the
+# deadline, in case the cooperative check inside determinize() is not reached in time.
+MAX_NFA_STATES = int(os.environ.get("MAX_NFA_STATES", 5000))
+MAX_DFA_STATES = int(os.environ.get("MAX_DFA_STATES", 50000))
+CONSTRUCTION_TIMEOUT = float(os.environ.get("CONSTRUCTION_TIMEOUT", 10))
+CONSTRUCTION_KILL_GRACE = 1.0
+INLINE_DFA_STATES = int(os.environ.get("INLINE_DFA_STATES", 4096))
+
+
+class InputTooLarge(LimitExceeded):
+    status_code = 413
+
+
+def check_nfa_size(nfa_states, source="NFA"):
+    if nfa_states > MAX_NFA_STATES:
+        raise InputTooLarge(f"The {source} has {nfa_states} states; the limit is {MAX_NFA_STATES}.",
+                            {"nfa_states": nfa_states, "max_nfa_states": MAX_NFA_STATES})
+
+
+def admit_nfa(nfa_def):
+    # Size check on the raw input first, then the one conversion to the core form.
+    check_nfa_size(len(nfa_def) if isinstance(nfa_def, Automaton) else len(nfa_def.get("states", ())))
+    return as_nfa(nfa_def)
+
+
+def _child(conn, fn, args):
+    try:
+        conn.send((True, fn(*args)))
+    except BaseException as e:
+        conn.send((False, e))
+    finally:
+        conn.close()
+
+
+# A fork server (where the platform has one) starts each child in milliseconds with
+# determinize already imported; plain spawn re-imports the whole app per child.
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context("forkserver")
+    _context.set_forkserver_preload(["determinize"])
+else:
+    _context = multiprocessing.get_context("spawn")
+
+
+def start():
+    # Bring the fork server up with the app so the first heavy request does not pay for it.
+    if _context.get_start_method() == "forkserver":
+        from multiprocessing import forkserver
+        forkserver.ensure_running()
+
+
+def run_killable(fn, args, timeout, stats):
+    # Blocks the calling thread (call it from a threadpool) until fn returns in a fresh
+    # child, or kills the child once timeout passes.
+    ctx = _context
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child, args=(sender, fn, args), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise LimitExceeded(f"Construction was stopped after {timeout:g}s.", dict(stats, stopped_by="killed"))
+        ok, value = receiver.recv()
+    except EOFError:
+        # The child died without answering: out of memory, or killed from outside.
+        raise LimitExceeded("Construction worker exited without a result.", dict(stats, stopped_by="crashed"))
+    finally:
+        if process.is_alive(): process.terminate()
+        process.join()
+        receiver.close()
+    if not ok: raise value
+    return value
+
+
+def guarded_determinize(nfa_def):
+    nfa = admit_nfa(nfa_def)
+    bound = subset_bound(nfa)
+    isolated = bound > INLINE_DFA_STATES
+    estimate = {"dfa_states_bound_log2": bound.bit_length() - 1, "isolated": isolated}
+    args = (nfa, MAX_DFA_STATES, CONSTRUCTION_TIMEOUT)
+    try:
+        if isolated:
+            limits = {"max_states": MAX_DFA_STATES, "time_limit_s": CONSTRUCTION_TIMEOUT}
+            dfa = run_killable(determinize, args, CONSTRUCTION_TIMEOUT + CONSTRUCTION_KILL_GRACE, limits)
+        else:
+            dfa = determinize(*args)
+    except LimitExceeded as e:
+        e.stats.update(estimate)
+        raise
+    dfa.stats.update(estimate)
+    return dfa
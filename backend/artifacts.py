@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from cache import LRUCache
+
+# ==============================================================================
+# GRAMMAR ARTIFACT STORE - in-process LRU in front of a shared SQLite file
+# ==============================================================================
+# Artifacts are the JSON-able results of a grammar analysis (FIRST/FOLLOW, item
+# sets, tables), keyed by kind plus the normalized grammar text. The SQLite file
+# is shared by every uvicorn worker and survives restarts; an empty
+# GRAMMAR_CACHE_PATH keeps the store in memory only. Disk trouble (read-only
+# volume, locked file) is logged and the disk is skipped for a backoff that doubles
+# with each failure, up to GRAMMAR_CACHE_MAX_BACKOFF seconds; it never fails the
+# request. The file keeps at most GRAMMAR_CACHE_DISK_ROWS artifacts and
+# GRAMMAR_CACHE_DISK_BYTES of JSON, dropping the oldest first.
+#
+# ARTIFACT_VERSION is part of every key: bump it whenever an analysis changes what it
+# produces, so files written by older code are never read back.
+ARTIFACT_VERSION = 2
+GRAMMAR_CACHE_PATH = os.environ.get("GRAMMAR_CACHE_PATH", os.path.join(tempfile.gettempdir(), "automata-app-grammars.sqlite3"))
+GRAMMAR_CACHE_SIZE = int(os.environ.get("GRAMMAR_CACHE_SIZE", 512))
+GRAMMAR_CACHE_DISK_ROWS = int(os.environ.get("GRAMMAR_CACHE_DISK_ROWS", 20_000))
+GRAMMAR_CACHE_DISK_BYTES = int(os.environ.get("GRAMMAR_CACHE_DISK_BYTES", 256 << 20))
+GRAMMAR_CACHE_MAX_BACKOFF = float(os.environ.get("GRAMMAR_CACHE_MAX_BACKOFF", 300))
+
+log = logging.getLogger(__name__)
+
+
+def normalize_grammar(grammar_str):
+    # Same line/segment/symbol splitting as GrammarProcessor._parse, so texts that parse
+    # to the same productions normalize to the same string.
+    lines = []
+    for line in grammar_str.strip().split('\n'):
+        if "->" not in line: continue
+        parts = line.strip().split('->')
+        if len(parts) != 2:
+            lines.append(line.strip())
+            continue
+        bodies = [' '.join(s for s in segment.strip().split(' ') if s) or 'epsilon' for segment in parts[1].split('|')]
+        lines.append(f"{parts[0].strip()} -> {' | '.join(bodies)}")
+    return '\n'.join(lines)
+
+
+def artifact_key(kind, grammar_str):
+    return hashlib.sha1(f"v{ARTIFACT_VERSION}\n{kind}\n{normalize_grammar(grammar_str)}".encode()).hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, path=GRAMMAR_CACHE_PATH, maxsize=GRAMMAR_CACHE_SIZE,
+                 max_rows=GRAMMAR_CACHE_DISK_ROWS, max_bytes=GRAMMAR_CACHE_DISK_BYTES):
+        self.memory = LRUCache(maxsize)
+        self.path = path or None
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+        self._backoff = 0
+        self._retry_at = 0
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self.disk_evictions = 0
+
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS artifacts (key TEXT PRIMARY KEY, kind TEXT, value TEXT, created REAL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS artifacts_created ON artifacts (created)")
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._conn = conn
+        return self._conn
+
+    def _disk(self, work):
+        # Runs work(conn) in one transaction; None while the disk is backing off or failed.
+        if self.path is None or time.monotonic() < self._retry_at: return None
+        with self._lock:
+            try:
+                with self._db() as conn:
+                    result = work(conn)
+                self._backoff = 0
+                return result
+            except sqlite3.Error as e:
+                self.disk_errors += 1
+                self._backoff = min(max(2 * self._backoff, 1), GRAMMAR_CACHE_MAX_BACKOFF)
+                self._retry_at = time.monotonic() + self._backoff
+                log.warning("Grammar cache %s failed (%s); skipping the disk for %gs.", self.path, e, self._backoff)
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                return None
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None: return value
+        row = self._disk(lambda conn: conn.execute("SELECT value FROM artifacts WHERE key = ?", (key,)).fetchone())
+        if row is None: return None
+        self.disk_hits += 1
+        value = json.loads(row[0])
+        self.memory.put(key, value)
+        return value
+
+    def put(self, key, kind, value):
+        self.memory.put(key, value)
+        # Rejections stay in memory: a later fix to the analysis must not be masked by
+        # an old error read back from disk.
+        if "error" in value: return
+        text = json.dumps(value)
+        self._disk(lambda conn: self._insert(conn, key, kind, text))
+
+    def _insert(self, conn, key, kind, text):
+        conn.execute("INSERT OR REPLACE INTO artifacts (key, kind, value, created) VALUES (?, ?, ?, ?)", (key, kind, text, time.time()))
+        # Oldest first: everything past max_rows, then whatever pushes the newest rows'
+        # running total of JSON over max_bytes.
+        evicted = conn.execute(
+            "DELETE FROM artifacts WHERE key IN (SELECT key FROM ("
+            " SELECT key, ROW_NUMBER() OVER newest AS n, SUM(LENGTH(value)) OVER newest AS total FROM artifacts"
+            " WINDOW newest AS (ORDER BY created DESC, key)) WHERE n > ? OR total > ?)",
+            (self.max_rows, self.max_bytes)).rowcount
+        self.disk_evictions += max(evicted, 0)
+
+    def stats(self):
+        backoff = max(self._retry_at - time.monotonic(), 0)
+        return dict(self.memory.stats(), disk_path=self.path, disk_hits=self.disk_hits, disk_errors=self.disk_errors,
+                    disk_evictions=self.disk_evictions, disk_backoff_s=round(backoff, 3), artifact_version=ARTIFACT_VERSION)
+
+
+artifact_store = ArtifactStore()
+
+
+# ==============================================================================
+# PARSE TABLE CACHE - analysis artifacts plus their compiled runtimes
+# ==============================================================================
+# analyze(grammar, kind) returns the artifact dict, or raises ValueError for a grammar
+# the method rejects; rejections are kept in memory too (never on disk), so a broken
+# grammar submitted by a whole class is analyzed once per worker. The artifact key doubles as the table_id callers pass
+# back to the parse endpoints.
+class TableCache:
+    def __init__(self, analyze, compiled_class, kinds, maxsize=256, store=artifact_store):
+        self.analyze = analyze
+        self.compiled_class = compiled_class
+        self.kinds = kinds  # the first is the default
+        self.compiled_entries = LRUCache(maxsize)
+        self.store = store
+
+    def analysis(self, grammar, kind=None):
+        kind = kind or self.kinds[0]
+        table_id = artifact_key(kind, grammar)
+        value = self.store.get(table_id)
+        if value is None:
+            try:
+                value = self.analyze(grammar, kind)
+            except ValueError as e:
+                value = {"error": str(e)}
+            self.remember(table_id, kind, value)
+        if "error" in value: raise ValueError(value["error"])
+        return table_id, value
+
+    def remember(self, table_id, kind, value):
+        # Also for artifacts built outside analyze(), e.g. by the streaming endpoints.
+        value["kind"] = kind
+        self.store.put(table_id, kind, value)
+
+    def get(self, table_id, analysis=None):
+        compiled = self.compiled_entries.get(table_id)
+        if compiled is None:
+            analysis = analysis or self.store.get(table_id)
+            if analysis is None or "error" in analysis or analysis.get("kind") not in self.kinds: return None
+            compiled = self.compiled_class(analysis)
+            self.compiled_entries.put(table_id, compiled)
+        return compiled
+
+    def compile(self, grammar, kind=None):
+        table_id, analysis = self.analysis(grammar, kind)
+        return table_id, self.get(table_id, analysis)
+
+    def stats(self):
+        return self.compiled_entries.stats()
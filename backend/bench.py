@@ -0,0 +1,313 @@
+"""Benchmark harness: synthetic workloads, per-stage and end-to-end timings, JSON out.
+
+    python bench.py --quick                          # small sizes, a few seconds
+    python bench.py --output bench.json              # full run
+    python bench.py --compare bench.json             # fail if any median regressed >25%
+    python bench.py --only startup --repeat 10       # import-time budget check only
+
+Stages are timed in-process on the same building blocks the endpoints use; the
+end-to-end numbers go through FastAPI's TestClient. Caches are cleared before every
+cold measurement; 'warm' end-to-end rows repeat the request against primed caches.
+TestClient needs httpx, which the server itself does not. The startup suite imports
+main in fresh interpreters and fails the run if that exceeds --import-budget or drags
+in one of the lazily loaded stacks (HEAVY_MODULES).
+
+Correctness is checked separately: tests/ compares each fast path with a slow
+reference (brute-force equivalence, automata-lib, naive search, the dense tables).
+Run it with python -m pytest -q from this directory; pytest is not a server
+dependency either.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+
+# Measure analyses, not a leftover SQLite file, unless the caller points at one.
+os.environ.setdefault("GRAMMAR_CACHE_PATH", "")
+
+from fastapi.testclient import TestClient
+
+import main
+from artifacts import artifact_store
+from derivatives import derivative_dfas, regex_to_dfa
+from determinize import determinize
+from grammar import GrammarProcessor
+from ll1 import CompiledLL1, ll1_analysis, ll1_tables
+from lr import CompiledLR, LR0Automaton, lalr_tables, lr_analysis, lr_tables, slr_tables
+from minimize import minimize_json, minimize_automaton
+from regex_cache import CompiledRegex, normalize_regex, regex_cache
+from render import render_service
+from simulate import CompiledDFA
+
+HEAVY_MODULES = ("automata", "matplotlib", "networkx", "numpy")
+IMPORT_PROBE = (
+    "import json, sys, time; started = time.perf_counter(); import main; "
+    "print(json.dumps([(time.perf_counter() - started) * 1000, [m for m in %r if m in sys.modules]]))" % (HEAVY_MODULES,)
+)
+
+PRESETS = {
+    "quick": {"blowup": [4, 8], "accept": [(50, 2), (200, 26)], "tower": [5, 20], "wide": [20, 100], "inputs": 200},
+    "full": {"blowup": [4, 8, 10, 12], "accept": [(100, 2), (500, 26), (2000, 62)], "tower": [5, 20, 60], "wide": [50, 200, 800], "inputs": 2000},
+}
+
+
+# ==============================================================================
+# WORKLOAD GENERATORS
+# ==============================================================================
+def blowup_regex(n):
+    # (a|b)*a(a|b){n}: the (n+1)-th symbol from the end is an 'a', so the minimal DFA needs
+    # 2^(n+1) states. The repeat is spelled out because the regex endpoints take every
+    # alphanumeric character, quantifier digits included, as an alphabet symbol.
+    return "(a|b)*a" + "(a|b)" * n
+
+
+def accept_string(length, alphabet_size, seed=0):
+    alphabet = (string.ascii_lowercase + string.ascii_uppercase + string.digits)[:alphabet_size]
+    rng = random.Random(seed)
+    return alphabet, ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def expression_tower(levels, ll1=False):
+    # One precedence level per non-terminal, like a real expression grammar; the LL(1)
+    # variant is the same language with left recursion removed.
+    lines = []
+    for i in range(levels):
+        if ll1:
+            lines.append(f"E{i} -> E{i + 1} E{i}_t")
+            lines.append(f"E{i}_t -> op{i} E{i + 1} E{i}_t | epsilon")
+        else:
+            lines.append(f"E{i} -> E{i} op{i} E{i + 1} | E{i + 1}")
+    lines.append(f"E{levels} -> ( E0 ) | id")
+    return '\n'.join(lines)
+
+
+def wide_alternation(width):
+    alternatives = ' | '.join(f"k{i} ARG" for i in range(width))
+    return f"S -> {alternatives}\nARG -> v | ( S )"
+
+
+def tower_sentences(levels, count, seed=0):
+    rng = random.Random(seed)
+    def expr(depth):
+        parts = ['id' if depth > 2 or rng.random() < 0.8 else f"( {expr(depth + 1)} )"]
+        for _ in range(rng.randint(0, 6)):
+            parts += [f"op{rng.randrange(levels)}", 'id']
+        return ' '.join(parts)
+    return [expr(0) for _ in range(count)]
+
+
+# ==============================================================================
+# TIMING
+# ==============================================================================
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"min_ms": round(min(samples), 3), "median_ms": round(statistics.median(samples), 3)}, result
+
+
+def reset_caches():
+    regex_cache.entries.clear()
+    derivative_dfas.clear()
+    artifact_store.memory.clear()
+    ll1_tables.compiled_entries.clear()
+    lr_tables.compiled_entries.clear()
+    for cache in (render_service.image_cache, render_service.layout_cache, render_service.spec_cache):
+        cache.clear()
+
+
+class Bench:
+    def __init__(self, client, repeat, render):
+        self.client = client
+        self.repeat = repeat
+        self.graph = {"format": "png", "inline": render}
+        self.results = []
+        self.budget_failures = []
+
+    def post(self, path, payload):
+        response = self.client.post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} -> {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def e2e(self, stages, name, path, payload, warm=True):
+        def cold():
+            reset_caches()
+            return self.post(path, payload)
+        stages[f"e2e:{name}"], result = timed(cold, self.repeat)
+        if warm: stages[f"e2e:{name}:warm"], result = timed(lambda: self.post(path, payload), self.repeat)
+        return result
+
+    def record(self, suite, case, params, stages, sizes):
+        self.results.append({"suite": suite, "case": case, "params": params, "stages": stages, "sizes": sizes})
+        slowest = max(stages.items(), key=lambda kv: kv[1]["median_ms"])
+        print(f"  {suite:8} {case:24} slowest {slowest[0]} {slowest[1]['median_ms']}ms", file=sys.stderr)
+
+
+# ==============================================================================
+# SUITES
+# ==============================================================================
+def bench_regex(bench, sizes):
+    for n in sizes:
+        regex = blowup_regex(n)
+        stages = {}
+        stages["normalize"], _ = timed(lambda: normalize_regex(regex), bench.repeat)
+        stages["nfa"], entry = timed(lambda: CompiledRegex(regex), bench.repeat)
+        stages["determinize"], dfa = timed(lambda: determinize(entry.nfa), bench.repeat)
+        stages["minimize"], minimal = timed(lambda: minimize_automaton(dfa), bench.repeat)
+        stages["compile"], _ = timed(lambda: CompiledDFA(*dfa.dense()), bench.repeat)
+        stages["derivatives"], _ = timed(lambda: regex_to_dfa(regex), bench.repeat)
+        nfa = bench.e2e(stages, "generate-nfa", "/api/generate-nfa/", {"regex": regex, **bench.graph})["nfa"]
+        bench.e2e(stages, "nfa-to-dfa", "/api/nfa-to-dfa/", {"nfa": nfa, "minimize": True, **bench.graph}, warm=False)
+        sizes = {"nfa_states": len(entry.nfa), "dfa_states": len(dfa.masks), "minimal_states": len(minimal.names)}
+        bench.record("regex", f"blowup-{n}", {"regex": regex}, stages, sizes)
+
+
+def bench_accept(bench, cases):
+    for length, alphabet_size in cases:
+        alphabet, accept = accept_string(length, alphabet_size)
+        stages = {}
+        stages["build"], (_, dfa_data) = timed(lambda: main.build_accept_string_dfa(alphabet, accept), bench.repeat)
+        stages["minimize"], _ = timed(lambda: minimize_json(dfa_data), bench.repeat)
+        payload = {"alphabet": alphabet, "accept_string": accept, **bench.graph}
+        bench.e2e(stages, "generate-dfa", "/api/generate-dfa/", payload, warm=False)
+        bench.e2e(stages, "generate-dfa:minimize", "/api/generate-dfa/", dict(payload, minimize=True), warm=False)
+        sizes = {"states": len(dfa_data["states"]), "transitions": len(dfa_data["transitions"])}
+        bench.record("accept", f"len{length}-sigma{alphabet_size}", {"length": length, "alphabet": alphabet_size}, stages, sizes)
+
+
+def bench_grammar(bench, case, lr_grammar, ll1_grammar, inputs):
+    stages = {}
+    stages["parse"], processor = timed(lambda: GrammarProcessor(lr_grammar, is_slr=True), bench.repeat)
+    stages["first"], first_sets = timed(processor.compute_first_sets, bench.repeat)
+    stages["follow"], follow_sets = timed(lambda: processor.compute_follow_sets(first_sets), bench.repeat)
+    stages["lr0_items"], automaton = timed(lambda: LR0Automaton(processor), bench.repeat)
+    stages["slr_table"], _ = timed(lambda: slr_tables(automaton, follow_sets), bench.repeat)
+    stages["lalr_table"], _ = timed(lambda: lalr_tables(automaton, first_sets, []), bench.repeat)
+    stages["lr_compile"], compiled_lr = timed(lambda: CompiledLR(lr_analysis(lr_grammar, "lalr")), bench.repeat)
+    stages["lr_parse_batch"], _ = timed(lambda: compiled_lr.parse_batch(inputs), bench.repeat)
+    sizes = {"productions": len(processor.productions) - 1, "lr0_states": len(automaton.closures),
+             "table_cells": len(automaton.closures) * (len(compiled_lr.terminals) + len(compiled_lr.non_terminals)),
+             "inputs": len(inputs), "tokens": sum(map(len, inputs))}
+    if ll1_grammar is not None:
+        stages["ll1_compile"], compiled_ll1 = timed(lambda: CompiledLL1(ll1_analysis(ll1_grammar)), bench.repeat)
+        stages["ll1_parse_batch"], _ = timed(lambda: compiled_ll1.parse_batch(inputs), bench.repeat)
+        bench.e2e(stages, "ll1-parser", "/api/ll1-parser/", {"grammar": ll1_grammar})
+        table_id = bench.post("/api/ll1-parser/", {"grammar": ll1_grammar})["table_id"]
+        stages["e2e:ll1-parse"], _ = timed(lambda: bench.post("/api/ll1/parse", {"table_id": table_id, "inputs": inputs}), bench.repeat)
+    bench.e2e(stages, "slr-parser", "/api/slr-parser/", {"grammar": lr_grammar})
+    bench.e2e(stages, "lalr-parser", "/api/lalr-parser/", {"grammar": lr_grammar})
+    table_id = bench.post("/api/lalr-parser/", {"grammar": lr_grammar})["table_id"]
+    stages["e2e:lr-parse"], _ = timed(lambda: bench.post("/api/lr/parse", {"table_id": table_id, "inputs": inputs}), bench.repeat)
+    bench.record("grammar", case, {"productions": sizes["productions"]}, stages, sizes)
+
+
+def bench_startup(bench, budget_ms):
+    # Import cost is paid once per process, so every sample is a fresh interpreter.
+    samples = []
+    for _ in range(bench.repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        samples.append(json.loads(out.stdout))
+    times = [ms for ms, _ in samples]
+    heavy = sorted({m for _, loaded in samples for m in loaded})
+    stages = {"import_main": {"min_ms": round(min(times), 3), "median_ms": round(statistics.median(times), 3)}}
+    bench.record("startup", "import-main", {"budget_ms": budget_ms}, stages, {"heavy_modules_loaded": len(heavy)})
+    if stages["import_main"]["median_ms"] > budget_ms:
+        bench.budget_failures.append(f"import main took {stages['import_main']['median_ms']}ms (budget {budget_ms}ms)")
+    if heavy:
+        bench.budget_failures.append(f"import main loaded {', '.join(heavy)}")
+
+
+def run_suites(bench, preset, only):
+    if "regex" in only: bench_regex(bench, preset["blowup"])
+    if "accept" in only: bench_accept(bench, preset["accept"])
+    if "grammar" in only:
+        for levels in preset["tower"]:
+            inputs = [s.split() for s in tower_sentences(levels, preset["inputs"])]
+            bench_grammar(bench, f"tower-{levels}", expression_tower(levels), expression_tower(levels, ll1=True), inputs)
+        for width in preset["wide"]:
+            rng = random.Random(width)
+            inputs = [[f"k{rng.randrange(width)}", 'v'] for _ in range(preset["inputs"])]
+            grammar = wide_alternation(width)
+            bench_grammar(bench, f"wide-{width}", grammar, grammar, inputs)
+
+
+# ==============================================================================
+# REPORTING
+# ==============================================================================
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "preset": "quick" if args.quick else "full",
+        "repeat": args.repeat, "render": args.render,
+    }
+
+
+def compare(report, baseline, threshold):
+    # Rows keyed by suite/case/stage; only stages present in both runs are compared.
+    def medians(data):
+        return {(r["suite"], r["case"], stage): t["median_ms"] for r in data["results"] for stage, t in r["stages"].items()}
+    old, new = medians(baseline), medians(report)
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        # Sub-millisecond stages are all noise; give them a 1ms floor.
+        ratio = max(new[key], 1.0) / max(old[key], 1.0)
+        if ratio > threshold: regressions.append({"row": "/".join(key), "baseline_ms": old[key], "current_ms": new[key], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="small sizes only")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per measurement (median reported)")
+    parser.add_argument("--only", default="startup,regex,accept,grammar", help="comma-separated suites")
+    parser.add_argument("--render", action="store_true", help="render PNGs inline in end-to-end requests")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report to check against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed current/baseline median ratio")
+    parser.add_argument("--import-budget", type=float, default=1000, help="max median ms for 'import main'")
+    args = parser.parse_args()
+
+    preset = PRESETS["quick" if args.quick else "full"]
+    only = set(args.only.split(","))
+    bench = Bench(None, args.repeat, args.render)
+    # Before the TestClient brings up the render pool, whose spawning workers would skew the samples.
+    if "startup" in only: bench_startup(bench, args.import_budget)
+    with TestClient(main.app) as client:
+        bench.client = client
+        run_suites(bench, preset, only)
+    report = {"meta": metadata(args), "results": bench.results, "budget_failures": bench.budget_failures}
+
+    for failure in bench.budget_failures:
+        print(f"BUDGET {failure}", file=sys.stderr)
+    status = 1 if bench.budget_failures else 0
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.threshold)
+        for row in report["regressions"]:
+            print(f"REGRESSION {row['row']}: {row['baseline_ms']}ms -> {row['current_ms']}ms (x{row['ratio']})", file=sys.stderr)
+        if report["regressions"]: status = 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+
+# ==============================================================================
+# LRU CACHE - size-bounded, with hit/miss counters for the stats endpoints
+# ==============================================================================
+class LRUCache:
+    # Bounded by entry count and, when maxcost is set, by the summed cost of the
+    # entries (e.g. approximate bytes) - whichever limit is hit first evicts. Caches
+    # are shared by the event loop and the threadpool, so every operation holds a lock.
+    def __init__(self, maxsize=256, maxcost=None):
+        self.maxsize = maxsize
+        self.maxcost = maxcost
+        self._data = OrderedDict()
+        self._costs = {}
+        self.total_cost = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, cost=1):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._set_cost(key, cost)
+
+    def set_cost(self, key, cost):
+        # Entries whose value grows after insertion (lazily derived data) re-declare their cost.
+        with self._lock:
+            if key in self._data: self._set_cost(key, cost)
+
+    def _set_cost(self, key, cost):
+        self.total_cost += cost - self._costs.get(key, 0)
+        self._costs[key] = cost
+        self._evict()
+
+    def _evict(self):
+        while len(self._data) > self.maxsize or (self.maxcost is not None and self.total_cost > self.maxcost and len(self._data) > 1):
+            key, _ = self._data.popitem(last=False)
+            self.total_cost -= self._costs.pop(key, 0)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._costs.clear()
+            self.total_cost = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            out = {
+                "size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+            if self.maxcost is not None: out.update(cost=self.total_cost, maxcost=self.maxcost)
+        return out
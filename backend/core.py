@@ -0,0 +1,257 @@
+from array import array
+
+# ==============================================================================
+# AUTOMATON CORE - interned ids, CSR transitions, final-state bitset
+# ==============================================================================
+# Every automaton the API builds or reads ends up in this form: states and symbols
+# are list positions, the edges of state i are columns/targets[offsets[i]:offsets[i+1]]
+# (column -1 is epsilon), and the final states are the set bits of one int. A missing
+# edge is the implicit trap state, so partial DFAs cost nothing for it; with default
+# set it is an edge to that state instead (the Aho-Corasick root), so a DFA that falls
+# back to one state from everywhere stores only its other edges. State names are
+# stringified once, when something serializes or draws the automaton; the JSON and
+# automata-lib shapes only appear in the adapters below.
+EPSILON = ''
+
+
+class Automaton:
+    __slots__ = ("names", "symbols", "start", "finals", "offsets", "columns", "targets", "nfa", "default", "_keys")
+
+    def __init__(self, names, symbols, offsets, columns, targets, finals, start=0, nfa=False, default=None):
+        self.names = names            # state id -> name as given (str, or int from automata-lib)
+        self.symbols = symbols        # column -> symbol
+        self.offsets = offsets
+        self.columns = columns
+        self.targets = targets
+        self.finals = finals          # bitset over state ids
+        self.start = start
+        self.nfa = nfa
+        self.default = default        # target of every missing edge; None for the trap state
+        self._keys = None
+
+    @classmethod
+    def from_rows(cls, names, symbols, rows, finals, start=0):
+        # Dense DFA rows (None for a missing edge); finals as one bool per state or a bitset.
+        offsets, columns, targets = array('i', [0]), array('i'), array('i')
+        for row in rows:
+            for col, t in enumerate(row):
+                if t is not None:
+                    columns.append(col)
+                    targets.append(t)
+            offsets.append(len(targets))
+        if not isinstance(finals, int): finals = _bits(i for i, f in enumerate(finals) if f)
+        return cls(names, symbols, offsets, columns, targets, finals, start)
+
+    @classmethod
+    def from_edges(cls, names, symbols, edges, finals, start=0, nfa=False, default=None):
+        # edges[i] = iterable of (column, target) for state i; finals as state ids or a bitset.
+        offsets, columns, targets = array('i', [0]), array('i'), array('i')
+        for out in edges:
+            for col, t in out:
+                columns.append(col)
+                targets.append(t)
+            offsets.append(len(targets))
+        if not isinstance(finals, int): finals = _bits(finals)
+        return cls(names, symbols, offsets, columns, targets, finals, start, nfa, default)
+
+    # Adapters from the JSON shapes and automata-lib objects.
+    @classmethod
+    def from_json(cls, dfa_def):
+        # The flat {"state,symbol": target} shape the DFA endpoints return.
+        names, lookup = _interned(dfa_def['states'], "DFA")
+        symbols = sorted({str(a) for a in dfa_def['alphabet']})
+        column = {sym: c for c, sym in enumerate(symbols)}
+        edges = [[] for _ in names]
+        for key, target in dfa_def.get('transitions', {}).items():
+            state, sep, sym = key.rpartition(',')
+            if not sep or sym not in column: raise ValueError(f"Malformed transition key '{key}'.")
+            edges[lookup(state)].append((column[sym], lookup(target)))
+        finals = [lookup(f) for f in dfa_def['final_states']]
+        return cls.from_edges(names, symbols, [sorted(out) for out in edges], finals, lookup(dfa_def['start_state']))
+
+    @classmethod
+    def from_nfa_json(cls, nfa_def):
+        names, lookup = _interned(nfa_def['states'], "NFA")
+        symbols = sorted({str(a) for a in nfa_def['alphabet']})
+        column = {sym: c for c, sym in enumerate(symbols)}
+        column[EPSILON] = -1
+        edges = [[] for _ in names]
+        for state, trans in nfa_def.get("transitions", {}).items():
+            out = edges[lookup(state)]
+            for sym, targets in trans.items():
+                if sym not in column: raise ValueError(f"Symbol '{sym}' is not in the NFA alphabet.")
+                out.extend((column[sym], lookup(t)) for t in targets)
+        finals = [lookup(f) for f in nfa_def['final_states']]
+        return cls.from_edges(names, symbols, edges, finals, lookup(nfa_def['start_state']), nfa=True)
+
+    @classmethod
+    def from_automata_lib(cls, fa):
+        try:
+            names = sorted(fa.states)
+        except TypeError:
+            names = sorted(fa.states, key=str)
+        index = {name: i for i, name in enumerate(names)}
+        symbols = sorted(str(a) for a in fa.input_symbols)
+        column = {sym: c for c, sym in enumerate(symbols)}
+        column[EPSILON] = -1
+        nfa = any(isinstance(t, (set, frozenset)) for trans in fa.transitions.values() for t in trans.values())
+        edges = [[] for _ in names]
+        for state, trans in fa.transitions.items():
+            out = edges[index[state]]
+            for sym, to in trans.items():
+                to = sorted(index[t] for t in to) if nfa else [index[to]]
+                out.extend((column[str(sym)], t) for t in to)
+        return cls.from_edges(names, symbols, [sorted(out) for out in edges], [index[f] for f in fa.final_states],
+                              index[fa.initial_state], nfa)
+
+    def to_json(self, sort_states=False, sort_finals=False):
+        keys, symbols, columns, targets, offsets = self.keys, self.symbols, self.columns, self.targets, self.offsets
+        return {
+            "states": sorted(keys) if sort_states else list(keys), "alphabet": list(symbols),
+            "transitions": {f"{keys[i]},{symbols[col]}": keys[t] for i in range(len(keys)) for col, t in self.full_edges(i)},
+            "start_state": keys[self.start],
+            "final_states": sorted(self.final_states) if sort_finals else self.final_states,
+        }
+
+    def nfa_json(self):
+        names, keys, symbols = self.names, self.keys, self.symbols
+        transitions = {}
+        for i in range(len(names)):
+            trans = {}
+            for col, t in self.edges(i):
+                trans.setdefault(symbols[col] if col >= 0 else EPSILON, []).append(names[t])
+            transitions[keys[i]] = {sym: sorted(ts) for sym, ts in trans.items()}
+        return {
+            "states": list(names), "alphabet": list(symbols), "transitions": transitions,
+            "start_state": names[self.start], "final_states": [names[i] for i in self.final_ids()],
+        }
+
+    def graph_spec(self, title):
+        # What render.graph_spec produces, straight from the arrays: parallel edges
+        # between the same two states share one comma-joined label.
+        keys, symbols = self.keys, self.symbols
+        labels = {}
+        for i in range(len(keys)):
+            for col, t in self.full_edges(i):
+                labels.setdefault((i, t), set()).add(symbols[col] if col >= 0 else 'ε')
+        return {
+            "title": title, "nodes": list(keys),
+            "edges": [(keys[u], keys[v], ",".join(sorted(ls))) for (u, v), ls in labels.items()],
+            "initial": keys[self.start], "finals": sorted(keys[i] for i in self.final_ids()),
+        }
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def labels(self):
+        return self.names
+
+    @property
+    def keys(self):
+        # State names as strings, built once.
+        if self._keys is None: self._keys = [str(name) for name in self.labels]
+        return self._keys
+
+    def edges(self, i):
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return zip(self.columns[a:b], self.targets[a:b])
+
+    def full_edges(self, i):
+        # The stored edges plus the implied ones to default, in column order.
+        if self.default is None: return self.edges(i)
+        row = [self.default] * len(self.symbols)
+        for col, t in self.edges(i): row[col] = t
+        return enumerate(row)
+
+    def final_ids(self):
+        finals, i, out = self.finals, 0, []
+        while finals:
+            if finals & 1: out.append(i)
+            finals >>= 1
+            i += 1
+        return out
+
+    def rows(self):
+        # Dense DFA rows, None where the edge is missing.
+        k, columns, targets, offsets = len(self.symbols), self.columns, self.targets, self.offsets
+        rows = []
+        for i in range(len(self)):
+            row = [self.default] * k
+            for e in range(offsets[i], offsets[i + 1]): row[columns[e]] = targets[e]
+            rows.append(row)
+        return rows
+
+    def dense(self):
+        # (names, symbols, table, finals) with the start state first and, if any edge is
+        # missing, an extra sink named None - the input minimize_table and CompiledDFA expect.
+        names, symbols, table = list(self.labels), list(self.symbols), self.rows()
+        finals = [bool(self.finals >> i & 1) for i in range(len(names))]
+        if self.default is None and len(self.targets) < len(names) * len(symbols):
+            sink = len(names)
+            names.append(None)
+            finals.append(False)
+            table = [[sink if t is None else t for t in row] for row in table] + [[sink] * len(symbols)]
+        if self.start != 0:
+            perm = [self.start] + [i for i in range(len(names)) if i != self.start]
+            position = {old: new for new, old in enumerate(perm)}
+            names = [names[i] for i in perm]
+            finals = [finals[i] for i in perm]
+            table = [[position[t] for t in table[i]] for i in perm]
+        return names, symbols, table, finals
+
+    def nbytes(self):
+        arrays = (self.offsets, self.columns, self.targets)
+        return sum(a.itemsize * len(a) for a in arrays) + 64 * len(self) + 64 * len(self.symbols)
+
+    # automata-lib style views, for code written against that API.
+    @property
+    def states(self):
+        return self.labels
+
+    @property
+    def input_symbols(self):
+        return self.symbols
+
+    @property
+    def initial_state(self):
+        return self.labels[self.start]
+
+    @property
+    def final_states(self):
+        labels = self.labels
+        return [labels[i] for i in self.final_ids()]
+
+    @property
+    def transitions(self):
+        labels, symbols, out = self.labels, self.symbols, {}
+        for i in range(len(labels)):
+            trans = out[labels[i]] = {}
+            for col, t in self.full_edges(i):
+                sym = symbols[col] if col >= 0 else EPSILON
+                if self.nfa: trans.setdefault(sym, set()).add(labels[t])
+                else: trans[sym] = labels[t]
+        return out
+
+
+def _bits(ids):
+    bits = 0
+    for i in ids: bits |= 1 << i
+    return bits
+
+
+def _interned(states, kind):
+    names = [str(s) for s in states]
+    index = {name: i for i, name in enumerate(names)}
+    if len(index) != len(names): raise ValueError(f"{kind} has duplicate state names.")
+
+    def lookup(state):
+        try:
+            return index[str(state)]
+        except KeyError:
+            raise ValueError(f"'{state}' is not a state of the {kind}.")
+    return names, lookup
+
+
+def as_nfa(nfa_def):
+    return nfa_def if isinstance(nfa_def, Automaton) else Automaton.from_nfa_json(nfa_def)
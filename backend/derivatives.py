@@ -0,0 +1,370 @@
+import os
+import time
+
+from admission import CONSTRUCTION_TIMEOUT, MAX_DFA_STATES, check_nfa_size
+from cache import LRUCache
+from core import Automaton
+from determinize import DEADLINE_CHECK_EVERY, LimitExceeded
+from regex_cache import QUANTIFIER, estimate_nfa_states, normalize_regex, parse_regex
+
+# ==============================================================================
+# REGEX TERMS - hash-consed AST with simplifying constructors
+# ==============================================================================
+# Every term is interned: structurally equal terms share one integer id, so term
+# equality is id equality and derivatives memoize on (id, symbol). The constructors
+# normalize as they build - '|' and '&' are flattened, deduplicated and sorted
+# (associativity, commutativity, idempotence), concatenation is kept right-nested
+# and the unit/zero laws are applied - which is what keeps the set of distinct
+# derivatives finite and the resulting DFA close to minimal.
+EMPTY, EPS = 0, 1
+EXPRESSION_TEXT_LIMIT = 120
+
+
+class Terms:
+    def __init__(self, alphabet):
+        self.nodes = [('empty',), ('eps',)]
+        self.ids = {node: i for i, node in enumerate(self.nodes)}
+        self.nullable = [False, True]
+        self.derivatives = {}
+        self.universal = self.star(self.chars(alphabet))  # every string over the alphabet
+
+    def _intern(self, node, nullable):
+        i = self.ids.get(node)
+        if i is None:
+            i = self.ids[node] = len(self.nodes)
+            self.nodes.append(node)
+            self.nullable.append(nullable)
+        return i
+
+    def chars(self, symbols):
+        return self._intern(('chars', frozenset(symbols)), False) if symbols else EMPTY
+
+    def cat(self, a, b):
+        if a == EMPTY or b == EMPTY: return EMPTY
+        # Re-associate to the right without recursing: (x y) b -> x (y b).
+        heads = []
+        while self.nodes[a][0] == 'cat':
+            heads.append(self.nodes[a][1])
+            a = self.nodes[a][2]
+        heads.append(a)
+        for head in reversed(heads):
+            # r* r* = r*
+            if head == EPS or (self.nodes[head][0] == 'star' and (b == head or (self.nodes[b][0] == 'cat' and self.nodes[b][1] == head))): continue
+            b = head if b == EPS else self._intern(('cat', head, b), self.nullable[head] and self.nullable[b])
+        return b
+
+    def star(self, a):
+        # (()|r)* = r*
+        if self.nodes[a][0] == 'or' and EPS in self.nodes[a][1]: a = self.union(k for k in self.nodes[a][1] if k != EPS)
+        if a in (EMPTY, EPS): return EPS
+        if self.nodes[a][0] == 'star': return a
+        return self._intern(('star', a), True)
+
+    def union(self, items):
+        kids = set()
+        for i in items:
+            if self.nodes[i][0] == 'or': kids.update(self.nodes[i][1])
+            elif i != EMPTY: kids.add(i)
+        if self.universal in kids: return self.universal
+        if not kids: return EMPTY
+        if len(kids) == 1: return kids.pop()
+        kids = tuple(sorted(kids))
+        return self._intern(('or', kids), any(self.nullable[k] for k in kids))
+
+    def intersection(self, items):
+        kids, charset = set(), None
+        for i in items:
+            if i == EMPTY: return EMPTY
+            node = self.nodes[i]
+            if node[0] == 'and': kids.update(node[1])
+            # Single-symbol sets intersect to one set (possibly empty).
+            elif node[0] == 'chars': charset = node[1] if charset is None else charset & node[1]
+            elif i != self.universal: kids.add(i)
+        if charset is not None:
+            if not charset: return EMPTY
+            kids.add(self.chars(charset))
+        if not kids: return self.universal
+        # () & r is () when r is nullable, nothing otherwise.
+        if EPS in kids: return EPS if all(self.nullable[k] for k in kids) else EMPTY
+        if len(kids) == 1: return kids.pop()
+        kids = tuple(sorted(kids))
+        return self._intern(('and', kids), all(self.nullable[k] for k in kids))
+
+    def shuffle(self, a, b):
+        if a == EMPTY or b == EMPTY: return EMPTY
+        if a == EPS: return b
+        if b == EPS: return a
+        a, b = min(a, b), max(a, b)
+        return self._intern(('shuffle', a, b), self.nullable[a] and self.nullable[b])
+
+    def repeat(self, a, low, high):
+        # a{low,high}; high None is unbounded. a{2,4} = a a (a (a)?)?
+        tail = self.star(a) if high is None else EPS
+        for _ in range((high or low) - low):
+            tail = self.union((EPS, self.cat(a, tail)))
+        for _ in range(low):
+            tail = self.cat(a, tail)
+        return tail
+
+    def derivative(self, r, symbol):
+        d = self.derivatives.get((r, symbol))
+        if d is None:
+            d = self.derivatives[(r, symbol)] = self._derive(r, symbol)
+        return d
+
+    def _derive(self, r, c):
+        node = self.nodes[r]
+        kind = node[0]
+        if kind == 'chars': return EPS if c in node[1] else EMPTY
+        if kind == 'cat':
+            head, rest = node[1], node[2]
+            d = self.cat(self.derivative(head, c), rest)
+            return self.union((d, self.derivative(rest, c))) if self.nullable[head] else d
+        if kind == 'star': return self.cat(self.derivative(node[1], c), r)
+        if kind == 'or': return self.union([self.derivative(k, c) for k in node[1]])
+        if kind == 'and': return self.intersection([self.derivative(k, c) for k in node[1]])
+        if kind == 'shuffle':
+            a, b = node[1], node[2]
+            return self.union((self.shuffle(self.derivative(a, c), b), self.shuffle(a, self.derivative(b, c))))
+        return EMPTY
+
+    def text(self, r, limit=EXPRESSION_TEXT_LIMIT):
+        out = self._text(r)
+        return out if len(out) <= limit else out[:limit - 1] + '…'
+
+    def _text(self, r, depth=0):
+        # Past a modest depth the text would be cut off anyway.
+        if depth > 40: return '…'
+        depth += 1
+        node = self.nodes[r]
+        kind = node[0]
+        if kind == 'empty': return '∅'
+        if kind == 'eps': return '()'
+        if kind == 'chars':
+            symbols = sorted(node[1])
+            return symbols[0] if len(symbols) == 1 else f"[{''.join(symbols)}]"
+        if kind == 'star':
+            inner = self._text(node[1], depth)
+            return (inner if self.nodes[node[1]][0] == 'chars' else f"({inner})") + '*'
+        if kind == 'cat':
+            parts = []
+            while kind == 'cat':
+                parts.append(node[1])
+                node = self.nodes[node[2]]
+                kind = node[0]
+            parts.append(self.ids[node])
+            return ''.join(f"({self._text(p, depth)})" if self.nodes[p][0] in ('or', 'and', 'shuffle') else self._text(p, depth) for p in parts)
+        op = {'or': '|', 'and': '&', 'shuffle': '^'}[kind]
+        kids = node[1] if kind != 'shuffle' else node[1:]
+        texts = [f"({self._text(k, depth)})" if self.nodes[k][0] in ('or', 'and', 'shuffle') else self._text(k, depth) for k in kids]
+        return op.join(texts if kind == 'shuffle' else sorted(texts, key=lambda t: (len(t), t)))
+
+
+# ==============================================================================
+# AST -> TERMS - the regex_cache parser's AST, over an explicit alphabet
+# ==============================================================================
+# Shorthand classes and escapes as automata-lib reads them, so both regex endpoints
+# agree on what '\d' or '\n' means. Negated shorthands are the alphabet minus the set.
+SHORTHAND_CLASSES = {
+    'd': frozenset("0123456789"),
+    'w': frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"),
+    's': frozenset(" \t\n\r\f\v"),
+}
+ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', 'v': '\v', 'f': '\f', 'a': '\a', 'b': '\b'}
+
+
+def _class_members(text):
+    # '[...]' body: single characters, '\x' escapes, '\d' '\w' '\s' and 'a-z' ranges.
+    # A '-' first or last in the body is literal.
+    body, members, i = text[1:-1], set(), 0
+    negated = body.startswith('^')
+    if negated: body = body[1:]
+    while i < len(body):
+        ch = body[i]
+        if ch == '\\' and i + 1 < len(body):
+            i += 1
+            if body[i] in SHORTHAND_CLASSES:
+                members |= SHORTHAND_CLASSES[body[i]]
+                i += 1
+                continue
+            ch = ESCAPES.get(body[i], body[i])
+        if i + 2 < len(body) and body[i + 1] == '-':
+            end, i = body[i + 2], i + 3
+            if end == '\\' and i < len(body):
+                end, i = ESCAPES.get(body[i], body[i]), i + 1
+            members.update(chr(c) for c in range(ord(ch), ord(end) + 1))
+        else:
+            members.add(ch)
+            i += 1
+    return negated, members
+
+
+def _atom_symbols(text, alphabet):
+    if text == '.': return alphabet
+    if text.startswith('\\'):
+        x = text[1]
+        if x in SHORTHAND_CLASSES: return SHORTHAND_CLASSES[x] & alphabet
+        if x.lower() in SHORTHAND_CLASSES: return alphabet - SHORTHAND_CLASSES[x.lower()]
+        return {ESCAPES.get(x, x)} & alphabet
+    if text.startswith('['):
+        negated, members = _class_members(text)
+        return alphabet - members if negated else members & alphabet
+    return {text} & alphabet
+
+
+def literal_symbols(node):
+    # The default alphabet: what the regex spells out. Like '.', the negated shorthands
+    # only make sense against an alphabet given explicitly and add nothing here.
+    kind = node[0]
+    if kind == 'atom':
+        text = node[1]
+        if text == '.': return set()
+        if text.startswith('\\'):
+            x = text[1]
+            if x in SHORTHAND_CLASSES: return set(SHORTHAND_CLASSES[x])
+            if x.lower() in SHORTHAND_CLASSES: return set()
+            return {ESCAPES.get(x, x)}
+        if text.startswith('['): return _class_members(text)[1]
+        return {text}
+    if kind == 'post': return literal_symbols(node[2])
+    if kind in ('cat', 'bin'): return set().union(*(literal_symbols(k) for k in node[-1]))
+    return set()
+
+
+def build_term(terms, node, alphabet):
+    kind = node[0]
+    if kind == 'empty': return EPS
+    if kind == 'atom': return terms.chars(_atom_symbols(node[1], alphabet))
+    if kind == 'cat':
+        acc = EPS
+        for kid in reversed(node[1]): acc = terms.cat(build_term(terms, kid, alphabet), acc)
+        return acc
+    if kind == 'post':
+        inner, op = build_term(terms, node[2], alphabet), node[1]
+        if op == '*': return terms.star(inner)
+        if op == '+': return terms.cat(inner, terms.star(inner))
+        if op == '?': return terms.union((inner, EPS))
+        low, high = QUANTIFIER.fullmatch(op).groups()
+        low = int(low or 0)
+        high = low if high is None else (None if high == '' or int(high) < 0 else int(high))
+        if low < 0 or (high is not None and high < low): raise ValueError(f"Invalid quantifier '{op}'.")
+        return terms.repeat(inner, low, high)
+    kids = [build_term(terms, k, alphabet) for k in node[2]]
+    if node[1] == '|': return terms.union(kids)
+    if node[1] == '&': return terms.intersection(kids)
+    acc = kids[0]
+    for kid in kids[1:]: acc = terms.shuffle(acc, kid)
+    return acc
+
+
+# ==============================================================================
+# DERIVATIVE DFA - states are the distinct derivatives, found breadth-first
+# ==============================================================================
+class DerivativeDFA(Automaton):
+    # States q0.. in discovery order; exprs maps each to the term id of its derivative.
+    __slots__ = ("terms", "exprs", "stats")
+
+    def expressions(self):
+        return {label: self.terms.text(r) for label, r in zip(self.labels, self.exprs)}
+
+    def cost(self):
+        # Rough bytes: the table plus the interned terms and memoized derivatives kept for expressions().
+        return self.nbytes() + 120 * (len(self.terms.nodes) + len(self.terms.derivatives))
+
+
+def _symbol_classes(terms, symbols):
+    # Symbols that belong to exactly the same character sets have the same derivative
+    # everywhere, so only one representative per class is ever differentiated.
+    sets = [node[1] for node in terms.nodes if node[0] == 'chars']
+    classes = {}
+    for col, sym in enumerate(symbols):
+        classes.setdefault(tuple(sym in s for s in sets), []).append(col)
+    return [(symbols[cols[0]], cols) for cols in classes.values()]
+
+
+def regex_to_dfa(regex, alphabet=None, max_states=MAX_DFA_STATES, time_limit=CONSTRUCTION_TIMEOUT):
+    started = time.perf_counter()
+    check_nfa_size(estimate_nfa_states(regex), "expanded regex")
+    ast = parse_regex(regex)
+    symbols = sorted(set(alphabet) if alphabet else literal_symbols(ast))
+    if not symbols: raise ValueError("The regex names no symbols; give an alphabet.")
+    terms = Terms(symbols)
+    root = build_term(terms, ast, set(symbols))
+    classes = _symbol_classes(terms, symbols)
+
+    ids, exprs, table = {root: 0}, [root], []
+    try:
+        _explore(terms, classes, ids, exprs, table, len(symbols), started, max_states, time_limit)
+    except RecursionError:
+        raise ValueError("The regex is nested too deeply.")
+    explored = len(exprs)
+    exprs, table = _merge_dead(terms, exprs, table)
+
+    stats = {
+        "states": len(exprs), "derivatives_explored": explored, "terms": len(terms.nodes), "derivatives_computed": len(terms.derivatives),
+        "symbol_classes": len(classes), "time_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+    dfa = DerivativeDFA.from_rows([f"q{i}" for i in range(len(exprs))], symbols, table, [terms.nullable[r] for r in exprs])
+    dfa.terms, dfa.exprs, dfa.stats = terms, exprs, stats
+    return dfa
+
+
+def _merge_dead(terms, exprs, table):
+    # Derivatives that denote the empty language without being syntactically ∅ (say
+    # aa & b*) cannot reach an accepting state; they all become one ∅ sink.
+    preds = [[] for _ in exprs]
+    for i, row in enumerate(table):
+        for t in set(row): preds[t].append(i)
+    live = [terms.nullable[r] for r in exprs]
+    stack = [i for i, ok in enumerate(live) if ok]
+    while stack:
+        for p in preds[stack.pop()]:
+            if not live[p]:
+                live[p] = True
+                stack.append(p)
+    dead = [i for i, ok in enumerate(live) if not ok]
+    if len(dead) <= 1: return exprs, table
+    renumber, kept = {}, []
+    for i in range(len(exprs)):
+        if live[i] or i == dead[0]:
+            renumber[i] = len(kept)
+            kept.append(i)
+    for i in dead: renumber[i] = renumber[dead[0]]
+    return [exprs[i] if live[i] else EMPTY for i in kept], [[renumber[t] for t in table[i]] for i in kept]
+
+
+def _explore(terms, classes, ids, exprs, table, width, started, max_states, time_limit):
+    while len(table) < len(exprs):
+        r, row = exprs[len(table)], [0] * width
+        for rep, cols in classes:
+            d = terms.derivative(r, rep)
+            target = ids.get(d)
+            if target is None:
+                if len(exprs) >= max_states:
+                    raise LimitExceeded(f"The DFA would have more than {max_states} states.", {
+                        "states_explored": len(table), "states_discovered": len(exprs), "terms": len(terms.nodes),
+                        "time_ms": round((time.perf_counter() - started) * 1000, 3), "max_states": max_states, "stopped_by": "max_states"})
+                target = ids[d] = len(exprs)
+                exprs.append(d)
+            for col in cols: row[col] = target
+        table.append(row)
+        if len(table) % DEADLINE_CHECK_EVERY == 0 and time.perf_counter() - started > time_limit:
+            raise LimitExceeded(f"Derivative construction took longer than {time_limit:g}s.", {
+                "states_explored": len(table), "states_discovered": len(exprs), "terms": len(terms.nodes),
+                "time_ms": round((time.perf_counter() - started) * 1000, 3), "time_limit_s": time_limit, "stopped_by": "time_limit"})
+
+
+# Keyed by the normalized regex, so spelling variants share an entry; bounded by count
+# and by approximate bytes.
+DERIVATIVE_CACHE_SIZE = int(os.environ.get("DERIVATIVE_CACHE_SIZE", 256))
+DERIVATIVE_CACHE_BYTES = int(os.environ.get("DERIVATIVE_CACHE_BYTES", 64 << 20))
+derivative_dfas = LRUCache(DERIVATIVE_CACHE_SIZE, maxcost=DERIVATIVE_CACHE_BYTES)
+
+
+def cached_regex_to_dfa(regex, alphabet=None):
+    key = (normalize_regex(regex), ''.join(sorted(set(alphabet))) if alphabet else None)
+    dfa = derivative_dfas.get(key)
+    if dfa is None:
+        dfa = regex_to_dfa(key[0], alphabet)
+        derivative_dfas.put(key, dfa, dfa.cost())
+    return dfa
@@ -0,0 +1,186 @@
+import sys
+import time
+
+from core import Automaton, as_nfa
+
+# ==============================================================================
+# SUBSET CONSTRUCTION - NFA states as bit positions, DFA states as int bitmasks
+# ==============================================================================
+# How many new subsets are explored between deadline checks.
+DEADLINE_CHECK_EVERY = 64
+
+
+class LimitExceeded(Exception):
+    # A construction stopped at a configured limit; stats describe how far it got.
+    status_code = 422
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+    def __reduce__(self):
+        return type(self), (str(self), self.stats)
+
+    def detail(self):
+        return {"error": str(self), "stats": self.stats}
+
+
+class SubsetDFA(Automaton):
+    # Filled in row by row by subset_states(); seal() packs the finished table into the
+    # core arrays. Labels ({q0, q1}) are only built when something serializes or draws it.
+    __slots__ = ("nfa_names", "masks", "table", "finals_mask", "stats")
+
+    def __init__(self, nfa_names, symbols, masks, table, finals_mask, stats):
+        super().__init__(None, symbols, None, None, None, 0)
+        self.nfa_names = nfa_names    # NFA state names, indexed by bit position
+        self.masks = masks            # DFA state id -> bitmask of NFA states
+        self.table = table            # DFA state id -> [target id per symbol], until sealed
+        self.finals_mask = finals_mask
+        self.stats = stats
+
+    def seal(self):
+        packed = Automaton.from_rows(None, self.symbols, self.table, [bool(m & self.finals_mask) for m in self.masks])
+        self.offsets, self.columns, self.targets, self.finals = packed.offsets, packed.columns, packed.targets, packed.finals
+        self.table = None
+
+    @property
+    def labels(self):
+        if self.names is None: self.names = [self.label(m) for m in self.masks]
+        return self.names
+
+    def label(self, mask):
+        names, members, i = self.nfa_names, [], 0
+        while mask:
+            if mask & 1: members.append(names[i])
+            mask >>= 1
+            i += 1
+        return '{' + ', '.join(sorted(members)) + '}'
+
+    def to_json(self):
+        return super().to_json(sort_states=True, sort_finals=True)
+
+
+def _index_nfa(nfa_def):
+    # Bit-parallel view of the NFA: epsilon lists, and per symbol a row of target masks.
+    nfa = as_nfa(nfa_def)
+    names, symbols, n = nfa.keys, nfa.symbols, len(nfa)
+    eps = [[] for _ in range(n)]
+    move = [[0] * n for _ in symbols]
+    for i in range(n):
+        for col, t in nfa.edges(i):
+            if col < 0: eps[i].append(t)
+            else: move[col][i] |= 1 << t
+    return names, symbols, eps, move, nfa.start, nfa.finals
+
+
+def _epsilon_closures(eps):
+    # One DFS per state; a state whose closure is already known is OR-ed in whole, not re-walked.
+    closure = [None] * len(eps)
+    for i in range(len(eps)):
+        mask, stack, seen = 1 << i, [i], {i}
+        while stack:
+            j = stack.pop()
+            if j != i and closure[j] is not None:
+                mask |= closure[j]
+                continue
+            for t in eps[j]:
+                if t not in seen:
+                    seen.add(t)
+                    mask |= 1 << t
+                    stack.append(t)
+        closure[i] = mask
+    return closure
+
+
+def _steps(move, closure):
+    # step[k][i] = closure(move(i, symbol k)); closure distributes over union, so a subset's
+    # successor is just the OR of its members' steps.
+    step = []
+    for row in move:
+        out = []
+        for targets in row:
+            acc = 0
+            while targets:
+                low = targets & -targets
+                acc |= closure[low.bit_length() - 1]
+                targets ^= low
+            out.append(acc)
+        step.append(out)
+    return step
+
+
+def subset_bound(nfa_def):
+    # Upper bound on the DFA size, from structure alone: every state but the start is the
+    # successor on some symbol k, i.e. a union of distinct non-empty step[k] values, and
+    # never more than 2^n subsets exist. Costs one closure pass, no exploration.
+    names, symbols, eps, move, start, finals_mask = _index_nfa(nfa_def)
+    step = _steps(move, _epsilon_closures(eps))
+    n = len(names)
+    bound = 1
+    for col in step:
+        bound += 1 << min(len(set(col) - {0}), n)
+    return min(bound, 1 << n)
+
+
+def determinize(nfa_def, max_states=None, time_limit=None):
+    # With max_states / time_limit (seconds) set, the construction stops with LimitExceeded
+    # as soon as it passes either one.
+    states = subset_states(nfa_def, max_states, time_limit)
+    dfa = next(states)
+    for _ in states: pass
+    return dfa
+
+
+def subset_states(nfa_def, max_states=None, time_limit=None):
+    # Generator form of determinize(): first the SubsetDFA being filled in, then the id of
+    # each DFA state as soon as its row is known. Its targets may not be expanded yet, but
+    # their masks already exist. stats is set once the last state is out.
+    started = time.perf_counter()
+    names, symbols, eps, move, start, finals_mask = _index_nfa(nfa_def)
+    closure = _epsilon_closures(eps)
+    step = _steps(move, closure)
+
+    def partial(reason):
+        elapsed = time.perf_counter() - started
+        return {"nfa_states": len(names), "subsets_explored": i, "subsets_discovered": len(masks),
+                "time_ms": round(elapsed * 1000, 3), "max_states": max_states, "time_limit_s": time_limit, "stopped_by": reason}
+
+    start_mask = closure[start]
+    ids = {start_mask: 0}
+    masks = [start_mask]
+    table = []
+    dfa = SubsetDFA(names, symbols, masks, table, finals_mask, None)
+    yield dfa
+    i = 0
+    while i < len(masks):
+        mask, bits = masks[i], []
+        while mask:
+            low = mask & -mask
+            bits.append(low.bit_length() - 1)
+            mask ^= low
+        row = []
+        for col in step:
+            acc = 0
+            for b in bits: acc |= col[b]
+            target = ids.get(acc)
+            if target is None:
+                if max_states is not None and len(masks) >= max_states:
+                    raise LimitExceeded(f"The DFA would have more than {max_states} states.", partial("max_states"))
+                target = ids[acc] = len(masks)
+                masks.append(acc)
+            row.append(target)
+        table.append(row)
+        yield i
+        i += 1
+        if time_limit is not None and i % DEADLINE_CHECK_EVERY == 0 and time.perf_counter() - started > time_limit:
+            raise LimitExceeded(f"Subset construction took longer than {time_limit:g}s.", partial("time_limit"))
+
+    # Everything the engine allocates only grows, so the final footprint is the peak.
+    memory = sys.getsizeof(ids) + sys.getsizeof(masks) + sum(sys.getsizeof(m) for m in masks)
+    memory += sys.getsizeof(table) + sum(sys.getsizeof(row) for row in table)
+    memory += sum(sys.getsizeof(m) for m in closure) + sum(sys.getsizeof(m) for col in step for m in col)
+    dfa.seal()
+    dfa.stats = {
+        "nfa_states": len(names), "subsets_explored": len(masks), "transitions": len(masks) * len(symbols),
+        "peak_memory_bytes": memory, "time_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
@@ -0,0 +1,193 @@
+from collections import defaultdict
+
+# ==============================================================================
+# HELPER CLASS FOR PARSING ALGORITHMS
+# ==============================================================================
+# FIRST/FOLLOW are solved as dataflow over dependency graphs: sets are int bitmasks
+# over a terminal index, strongly connected components are collapsed (every member
+# of a cycle ends up with the same set), and components are visited in topological
+# order, so each dependency edge is OR-ed exactly once.
+EPSILON = 'epsilon'
+EPS_BIT = 1  # bit 0 is 'epsilon', shared with a terminal that happens to be spelled 'epsilon'
+
+
+def _components(nodes, succ):
+    # Iterative Tarjan. Returns SCCs ordered so every edge goes from an earlier
+    # component to a later one (or stays inside one), plus node -> component id.
+    index, low, on_stack, stack = {}, {}, set(), []
+    sccs = []
+    for root in nodes:
+        if root in index: continue
+        work = [(root, iter(succ.get(root, ())))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, it = work[-1]
+            for nxt in it:
+                if nxt not in index:
+                    index[nxt] = low[nxt] = len(index)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, iter(succ.get(nxt, ()))))
+                    break
+                if nxt in on_stack:
+                    low[node] = min(low[node], index[nxt])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        scc.append(member)
+                        if member == node: break
+                    sccs.append(scc)
+    sccs.reverse()
+    comp = {node: c for c, scc in enumerate(sccs) for node in scc}
+    return sccs, comp
+
+
+def propagate_masks(nodes, direct, edges):
+    # value(n) = direct(n) | OR of value(m) over edges m -> n, solved in one topological pass.
+    succ, pred = defaultdict(list), defaultdict(list)
+    for src, dst in edges:
+        succ[src].append(dst)
+        pred[dst].append(src)
+    sccs, comp = _components(nodes, succ)
+    comp_value = [0] * len(sccs)
+    for c, scc in enumerate(sccs):
+        value = 0
+        for node in scc:
+            value |= direct.get(node, 0)
+            for src in pred[node]:
+                if comp[src] != c: value |= comp_value[comp[src]]
+        comp_value[c] = value
+    return {node: comp_value[comp[node]] for node in nodes}
+
+
+class GrammarProcessor:
+    def __init__(self, grammar_str, is_slr=False):
+        self.grammar = defaultdict(list)
+        self.terminals = set()
+        self.non_terminals = set()
+        self.start_symbol = None
+        self.productions = [] # List of (Head, Body) tuples
+        self.is_slr = is_slr
+        self._parse(grammar_str)
+
+    def _parse(self, grammar_str):
+        lines = [line.strip() for line in grammar_str.strip().split('\n') if "->" in line]
+        if not lines: raise ValueError("Grammar is empty or malformed.")
+
+        original_start_symbol = lines[0].split('->')[0].strip()
+        if self.is_slr:
+            self.start_symbol = f"{original_start_symbol}'"
+            self.non_terminals.add(self.start_symbol)
+            self.productions.append((self.start_symbol, [original_start_symbol]))
+            self.grammar[self.start_symbol].append([original_start_symbol])
+        else:
+            self.start_symbol = original_start_symbol
+
+        for line in lines:
+            head, body_str = line.split('->')
+            head = head.strip()
+            self.non_terminals.add(head)
+            for body_segment in body_str.split('|'):
+                body = [s for s in body_segment.strip().split(' ') if s]
+                processed_body = [] if body == ['epsilon'] else body
+                self.productions.append((head, processed_body))
+                self.grammar[head].append(processed_body)
+
+        all_symbols = {sym for prods in self.grammar.values() for prod in prods for sym in prod}
+        # Assume non-terminals are uppercase or contain '_'
+        self.non_terminals.update({s for s in all_symbols if s[0].isupper() or '_' in s})
+        self.terminals = all_symbols - self.non_terminals
+        if not self.is_slr: self.terminals.add('$')
+
+    def terminal_index(self):
+        symbols = [EPSILON] + sorted((self.terminals | {'$'}) - {EPSILON})
+        return symbols, {sym: 1 << i for i, sym in enumerate(symbols)}
+
+    @staticmethod
+    def unmask(mask, symbols):
+        out = set()
+        while mask:
+            low = mask & -mask
+            out.add(symbols[low.bit_length() - 1])
+            mask ^= low
+        return out
+
+    def _first_masks(self, bit):
+        # Nullability first, with a counter per production (no repeated rescans). A production
+        # contributes only up to its first terminal; an 'epsilon' terminal there still counts as
+        # nullable, exactly as the set-based definition behaves.
+        nullable = set()
+        waiting = defaultdict(list)
+        pending = []
+        for head, body in self.productions:
+            prefix, tail_ok = [], True
+            for symbol in body:
+                if symbol in self.terminals:
+                    tail_ok = symbol == EPSILON
+                    break
+                prefix.append(symbol)
+            if not tail_ok: continue
+            entry = [head, len(prefix)]
+            pending.append(entry)
+            for symbol in prefix: waiting[symbol].append(entry)
+        queue = [entry[0] for entry in pending if entry[1] == 0]
+        while queue:
+            head = queue.pop()
+            if head in nullable: continue
+            nullable.add(head)
+            for entry in waiting.pop(head, ()):
+                entry[1] -= 1
+                if entry[1] == 0: queue.append(entry[0])
+
+        direct, edges = defaultdict(int), []
+        for head, body in self.productions:
+            for symbol in body:
+                if symbol in self.terminals:
+                    direct[head] |= bit[symbol]
+                    break
+                edges.append((symbol, head))
+                if symbol not in nullable: break
+        masks = propagate_masks(list(self.non_terminals), direct, edges)
+        for nt in self.non_terminals:
+            masks[nt] = (masks[nt] & ~EPS_BIT) | (EPS_BIT if nt in nullable else 0)
+        return masks
+
+    def compute_first_sets(self):
+        symbols, bit = self.terminal_index()
+        masks = self._first_masks(bit)
+        return {nt: self.unmask(mask, symbols) for nt, mask in masks.items()}
+
+    def compute_follow_sets(self, first_sets):
+        symbols, bit = self.terminal_index()
+        first_mask = {nt: sum(bit[t] for t in first if t in bit) for nt, first in first_sets.items()}
+
+        def mask_of(symbol):
+            if symbol in first_mask: return first_mask[symbol]
+            return bit.get(symbol, 0)
+
+        # One right-to-left pass per production: FIRST of the remaining suffix flows into
+        # FOLLOW(X) directly; a fully nullable suffix adds the edge FOLLOW(head) -> FOLLOW(X).
+        direct, edges = defaultdict(int), []
+        direct[self.start_symbol] |= bit['$']
+        for head, body in self.productions:
+            suffix, suffix_nullable = 0, True
+            for symbol in reversed(body):
+                if symbol in self.non_terminals:
+                    direct[symbol] |= suffix
+                    if suffix_nullable: edges.append((head, symbol))
+                sym_mask = mask_of(symbol)
+                if sym_mask & EPS_BIT:
+                    suffix |= sym_mask & ~EPS_BIT
+                else:
+                    suffix, suffix_nullable = sym_mask, False
+        masks = propagate_masks(list(self.non_terminals), direct, edges)
+        return {nt: self.unmask(mask & ~EPS_BIT, symbols) for nt, mask in masks.items()}
@@ -0,0 +1,199 @@
+import codecs
+import json
+import os
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from admission import InputTooLarge
+from determinize import LimitExceeded
+from cache import LRUCache
+from core import Automaton
+
+# ==============================================================================
+# KEYWORD AUTOMATA - Aho-Corasick: keyword trie plus failure links
+# ==============================================================================
+# The trie has one node per distinct keyword prefix and the failure links are set in
+# one breadth-first pass, so building is linear in the total keyword length. Each node
+# keeps only the edges it really has: in the trie a missing edge is the (implicit) trap
+# state, and in the flattened search DFA a missing edge goes back to the root (the
+# core's default target, never stored). A node with no edges of its own shares its
+# failure target's row instead of copying it. Serialized or drawn, the flattened DFA
+# still spells out one edge per state and symbol, so it is refused with LimitExceeded
+# above KEYWORD_DFA_MAX_CELLS of them; scanning and the trie never flatten.
+KEYWORD_MAX_LENGTH = int(os.environ.get("KEYWORD_MAX_LENGTH", 1_000_000))
+KEYWORD_DFA_MAX_CELLS = int(os.environ.get("KEYWORD_DFA_MAX_CELLS", 2_000_000))
+KEYWORD_SCAN_MAX_MATCHES = int(os.environ.get("KEYWORD_SCAN_MAX_MATCHES", 100_000))
+KEYWORD_CACHE_SIZE = int(os.environ.get("KEYWORD_CACHE_SIZE", 128))
+SCAN_CHUNK_BYTES = 1 << 20
+
+
+class KeywordAutomaton:
+    def __init__(self, keywords, alphabet=None):
+        started = time.perf_counter()
+        keywords = list(dict.fromkeys(keywords))
+        if not keywords: raise ValueError("Give at least one keyword.")
+        if not all(keywords): raise ValueError("Keywords must not be empty.")
+        total = sum(map(len, keywords))
+        if total > KEYWORD_MAX_LENGTH:
+            raise InputTooLarge(f"The keywords have {total} characters in total; the limit is {KEYWORD_MAX_LENGTH}.",
+                                {"total_length": total, "max_total_length": KEYWORD_MAX_LENGTH})
+        used = set().union(*keywords)
+        if alphabet:
+            stray = used - set(alphabet)
+            if stray: raise ValueError(f"Keywords use symbols outside the alphabet: {''.join(sorted(stray))}")
+            used = set(alphabet)
+        self.keywords = keywords
+        self.symbols = sorted(used)
+
+        goto, word = [{}], [-1]
+        for k, keyword in enumerate(keywords):
+            node = 0
+            for ch in keyword:
+                child = goto[node].get(ch)
+                if child is None:
+                    child = goto[node][ch] = len(goto)
+                    goto.append({})
+                    word.append(-1)
+                node = child
+            word[node] = k
+
+        # fail: longest proper suffix that is also a trie node. out: the nearest node on the
+        # failure chain that ends a keyword (0 if none), so reporting skips non-matching links.
+        n = len(goto)
+        fail, out, order = [0] * n, [0] * n, [0]
+        for node in order:
+            for ch, child in goto[node].items():
+                order.append(child)
+                if node:
+                    f = fail[node]
+                    while f and ch not in goto[f]: f = fail[f]
+                    fail[child] = goto[f].get(ch, 0)
+                f = fail[child]
+                out[child] = f if word[f] >= 0 else out[f]
+        self.goto, self.word, self.fail, self.out, self.order = goto, word, fail, out, order
+        self.labels = [f"q{i}" for i in range(n)]
+        self._search_dfa = None
+        self.stats = {"keywords": len(keywords), "total_length": total, "trie_states": n,
+                      "trie_edges": n - 1, "build_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+    def flat_rows(self):
+        # Flattened goto function, one dict per node, root targets left out. Nodes are
+        # visited breadth-first, so a failure target's row is always ready first.
+        goto, fail = self.goto, self.fail
+        rows = [None] * len(goto)
+        rows[0] = goto[0]
+        for node in self.order[1:]:
+            inherited = rows[fail[node]]
+            rows[node] = {**inherited, **goto[node]} if goto[node] else inherited
+        self.stats["flat_edges"] = sum(map(len, rows))
+        return rows
+
+    def scan(self, text, state=0, offset=0, limit=None):
+        # All (start, end, keyword index) occurrences, overlapping ones included. Returns
+        # (matches, count, state); pass state and offset back in to continue a longer text.
+        goto, fail, word, out = self.goto, self.fail, self.word, self.out
+        lengths = [len(k) for k in self.keywords]
+        matches, count = [], 0
+        for i, ch in enumerate(text, offset + 1):
+            while state and ch not in goto[state]: state = fail[state]
+            state = goto[state].get(ch, 0)
+            t = state if word[state] >= 0 else out[state]
+            while t:
+                k = word[t]
+                count += 1
+                if limit is None or len(matches) < limit: matches.append((i - lengths[k], i, k))
+                t = out[t]
+        return matches, count, state
+
+    def trie_json(self):
+        return self.dfa("exact").to_json()
+
+    def failure_links(self):
+        return {self.labels[i]: self.labels[f] for i, f in enumerate(self.fail) if i}
+
+    def dfa(self, mode, flatten=True):
+        # mode=exact accepts exactly the keywords (the trie); mode=search accepts every string
+        # that ends with a keyword. Unflattened, search is the trie with its failure links as
+        # 'fail' edges, which is only meant for drawing.
+        symbols, labels = self.symbols, self.labels
+        column = {ch: c for c, ch in enumerate(symbols)}
+        if mode == "exact":
+            return Automaton.from_edges(labels, symbols, self._trie_edges(column), [i for i, k in enumerate(self.word) if k >= 0])
+        reports = [k >= 0 or out > 0 for k, out in zip(self.word, self.out)]
+        if flatten:
+            # Kept: the packed arrays are far smaller than the row dicts they come from.
+            if self._search_dfa is None:
+                cells = len(labels) * len(symbols)
+                if cells > KEYWORD_DFA_MAX_CELLS:
+                    raise LimitExceeded(f"The flattened DFA would have {cells} transitions; the limit is {KEYWORD_DFA_MAX_CELLS}. "
+                                        "Use flatten=false or mode=exact.",
+                                        {"trie_states": len(labels), "symbols": len(symbols), "cells": cells,
+                                         "max_cells": KEYWORD_DFA_MAX_CELLS, "stopped_by": "max_cells"})
+                edges = [sorted((column[ch], t) for ch, t in row.items()) for row in self.flat_rows()]
+                self._search_dfa = Automaton.from_edges(labels, symbols, edges, [i for i, r in enumerate(reports) if r], default=0)
+            return self._search_dfa
+        fail_col, edges = len(symbols), self._trie_edges(column)
+        for i, f in enumerate(self.fail):
+            if f: edges[i].append((fail_col, f))
+        return Automaton.from_edges(labels, symbols + ["fail"], edges, [i for i, r in enumerate(reports) if r])
+
+    def _trie_edges(self, column):
+        return [sorted((column[ch], t) for ch, t in row.items()) for row in self.goto]
+
+
+keyword_automata = LRUCache(KEYWORD_CACHE_SIZE)
+
+
+def cached_keywords(keywords, alphabet=None):
+    key = (tuple(keywords), ''.join(sorted(set(alphabet))) if alphabet else None)
+    automaton = keyword_automata.get(key)
+    if automaton is None:
+        automaton = KeywordAutomaton(keywords, alphabet)
+        keyword_automata.put(key, automaton)
+    return automaton
+
+
+def scan_batch(automaton, texts):
+    started = time.perf_counter()
+    results, total, budget = [], 0, KEYWORD_SCAN_MAX_MATCHES
+    for text in texts:
+        matches, count, _ = automaton.scan(text, limit=budget)
+        budget -= len(matches)
+        total += count
+        results.append([list(m) for m in matches])
+    elapsed = time.perf_counter() - started
+    symbols = sum(map(len, texts))
+    return {
+        "keywords": automaton.keywords, "matches": results,
+        "stats": {"texts": len(texts), "symbols": symbols, "matches": total, "truncated": total > KEYWORD_SCAN_MAX_MATCHES,
+                  "time_ms": round(elapsed * 1000, 3), "symbols_per_second": round(symbols / elapsed) if elapsed > 0 else None},
+    }
+
+
+# ==============================================================================
+# STREAMING SCAN - uploaded text in, NDJSON matches out
+# ==============================================================================
+# The upload is read in chunks of chunk_size bytes and decoded incrementally, so a
+# UTF-8 character cut by a chunk boundary is completed by the next chunk. Offsets are
+# character positions in the whole upload. Only the automaton state is carried from
+# one chunk to the next, so a match may span a chunk boundary and memory stays at one
+# chunk.
+async def stream_scan(automaton, upload, chunk_size=SCAN_CHUNK_BYTES):
+    started = time.perf_counter()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    keywords = automaton.keywords
+    state = offset = total = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            matches, count, state = await run_in_threadpool(automaton.scan, text, state, offset)
+            offset += len(text)
+            total += count
+            if matches:
+                yield ("\n".join(json.dumps({"start": s, "end": e, "keyword": keywords[k]}) for s, e, k in matches) + "\n").encode()
+        if not chunk:
+            break
+    summary = {"symbols": offset, "matches": total, "time_ms": round((time.perf_counter() - started) * 1000, 3)}
+    yield (json.dumps({"summary": summary}) + "\n").encode()
@@ -0,0 +1,87 @@
+import os
+from collections import deque
+
+# ==============================================================================
+# LAYOUT ENGINES - node positions for a graph spec (nodes, edges, initial, finals)
+# ==============================================================================
+# Every engine takes a spec and returns one (x, y) per entry of spec["nodes"], in order.
+# "spring" is the original force-directed look and is only used for small graphs,
+# since each iteration is O(n^2); "layered" ranks states by BFS distance from the
+# start state and runs in O((V + E) log V), so it scales to large DFAs.
+LAYOUT_ENGINE = os.environ.get("RENDER_LAYOUT", "auto")
+SPRING_MAX_NODES = int(os.environ.get("RENDER_SPRING_MAX_NODES", 30))
+
+
+def spring_layout(spec):
+    import networkx as nx
+    G = nx.DiGraph()
+    G.add_nodes_from(spec["nodes"])
+    G.add_edges_from((u, v) for u, v, _ in spec["edges"])
+    pos = nx.spring_layout(G, seed=42, k=1.5/((len(G.nodes()))**0.5) if len(G.nodes()) > 1 else 1)
+    return [tuple(float(c) for c in pos[node]) for node in spec["nodes"]]
+
+
+def layer_nodes(spec):
+    # BFS ranks from the start state; states it cannot reach get their own ranks after it.
+    nodes = spec["nodes"]
+    n = len(nodes)
+    index = {name: i for i, name in enumerate(nodes)}
+    succ, pred = [[] for _ in range(n)], [[] for _ in range(n)]
+    for u, v, _ in spec["edges"]:
+        if u != v:
+            succ[index[u]].append(index[v])
+            pred[index[v]].append(index[u])
+
+    rank = [-1] * n
+    roots = ([index[spec["initial"]]] if spec["initial"] in index else []) + list(range(n))
+    next_rank = 0
+    for root in roots:
+        if rank[root] != -1: continue
+        rank[root] = next_rank
+        queue = deque([root])
+        while queue:
+            i = queue.popleft()
+            next_rank = max(next_rank, rank[i] + 1)
+            for j in succ[i]:
+                if rank[j] == -1:
+                    rank[j] = rank[i] + 1
+                    queue.append(j)
+
+    layers = [[] for _ in range(next_rank)]
+    for i in range(n):
+        layers[rank[i]].append(i)
+
+    # One barycenter sweep (Sugiyama-style): order each layer by the mean slot of its
+    # predecessors in earlier layers, which removes most crossings on automata graphs.
+    slot = [0.0] * n
+    for layer in layers:
+        def barycenter(i):
+            earlier = [slot[p] for p in pred[i] if rank[p] < rank[i]]
+            return sum(earlier) / len(earlier) if earlier else float(slot[i])
+        for s, i in enumerate(layer): slot[i] = s
+        layer.sort(key=barycenter)
+        for s, i in enumerate(layer): slot[i] = s
+    return layers
+
+
+def layered_layout(spec):
+    layers = layer_nodes(spec)
+    pos = [None] * len(spec["nodes"])
+    for r, layer in enumerate(layers):
+        offset = (len(layer) - 1) / 2
+        for s, i in enumerate(layer):
+            pos[i] = (float(r), float(offset - s))
+    return pos
+
+
+LAYOUT_ENGINES = {"spring": spring_layout, "layered": layered_layout}
+
+
+def choose_engine(spec, engine=None):
+    engine = engine or LAYOUT_ENGINE
+    if engine in LAYOUT_ENGINES: return engine
+    return "spring" if len(spec["nodes"]) <= SPRING_MAX_NODES else "layered"
+
+
+def compute_layout(spec, engine=None):
+    return LAYOUT_ENGINES[choose_engine(spec, engine)](spec)
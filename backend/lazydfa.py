@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+
+from determinize import _epsilon_closures, _index_nfa, _steps
+
+# ==============================================================================
+# LAZY DFA - subset construction on demand while scanning, bounded state cache
+# ==============================================================================
+# Only the subsets an input actually visits are built, each at most once per cache
+# generation. A table holds at most LAZY_DFA_STATES states; when it is full it is
+# flushed and refilled from the current state. If it has to flush again within
+# LAZY_DFA_BAILOUT symbols per cached state, caching is not paying off (the input
+# keeps visiting new subsets), and the rest of that string is scanned by plain NFA
+# simulation over bitmasks. Either way time is linear in the input and memory is
+# bounded by the table size, whatever the size of the full DFA.
+LAZY_DFA_STATES = int(os.environ.get("LAZY_DFA_STATES", 2048))
+LAZY_DFA_BAILOUT = 10
+
+
+class _Table:
+    # One lazily filled transition table: state id -> NFA-state mask, row of target ids
+    # (None until first used). restart is OR-ed into every target; the unanchored search
+    # table uses it to start a new match attempt at every position.
+    def __init__(self, step, start_mask, accept_mask, max_states, restart=0):
+        self.step = step
+        self.start_mask = start_mask
+        self.accept_mask = accept_mask
+        self.max_states = max_states
+        self.restart = restart
+        self.flushes = 0
+        self.since_flush = 0  # symbols scanned through this table since it was last flushed
+        self._reset()
+
+    def _reset(self):
+        self.ids, self.masks, self.rows, self.accepting = {}, [], [], []
+
+    def state(self, mask):
+        s = self.ids.get(mask)
+        if s is None:
+            if len(self.masks) >= self.max_states:
+                self.flushes += 1
+                self._reset()
+            s = self.ids[mask] = len(self.masks)
+            self.masks.append(mask)
+            self.rows.append([None] * len(self.step))
+            self.accepting.append(bool(mask & self.accept_mask))
+        return s
+
+    def target(self, mask, col):
+        acc, step = self.restart, self.step[col]
+        while mask:
+            low = mask & -mask
+            acc |= step[low.bit_length() - 1]
+            mask ^= low
+        return acc
+
+    def advance(self, s, col):
+        # Cache miss. If adding the target flushes the table, s's row is gone with it.
+        flushes = self.flushes
+        t = self.state(self.target(self.masks[s], col))
+        if self.flushes == flushes: self.rows[s][col] = t
+        return t
+
+    def stats(self):
+        return {"cached_states": len(self.masks), "max_states": self.max_states, "flushes": self.flushes}
+
+
+class LazyDFA:
+    def __init__(self, nfa, max_states=LAZY_DFA_STATES):
+        names, symbols, eps, move, start, finals_mask = _index_nfa(nfa)
+        n = len(names)
+        self.symbols = symbols
+        self.column = {sym: k for k, sym in enumerate(symbols)}
+        # The extra last column is for characters outside the alphabet: it leads nowhere.
+        closure = _epsilon_closures(eps)
+        step = _steps(move, closure) + [[0] * n]
+        start_mask = closure[start]
+        self.forward = _Table(step, start_mask, finals_mask, max_states)
+        self.unanchored = _Table(step, start_mask, finals_mask, max_states, restart=start_mask)
+
+        # The reversed NFA finds where a match ends up starting: it begins in the final
+        # states and accepts on reaching the original start state.
+        reps = [[] for _ in range(n)]
+        for i, targets in enumerate(eps):
+            for t in targets: reps[t].append(i)
+        rmove = [[0] * n for _ in symbols]
+        for k, row in enumerate(move):
+            for i, targets in enumerate(row):
+                while targets:
+                    low = targets & -targets
+                    rmove[k][low.bit_length() - 1] |= 1 << i
+                    targets ^= low
+        rclosure = _epsilon_closures(reps)
+        rstart = 0
+        for i in range(n):
+            if finals_mask >> i & 1: rstart |= rclosure[i]
+        self.backward = _Table(_steps(rmove, rclosure) + [[0] * n], rstart, 1 << start, max_states)
+        self.fallbacks = 0
+        # Scans mutate the shared tables, so concurrent requests take turns.
+        self._lock = threading.Lock()
+
+    def encode(self, text):
+        column, unknown = self.column, len(self.symbols)
+        return [column.get(ch, unknown) for ch in text]
+
+    def _scan(self, table, cols, stop_at_first):
+        # Returns (first, last): how many symbols had been read at the first and the last
+        # accepting state (-1 if none). With stop_at_first the scan ends at the first.
+        s = table.state(table.start_mask)
+        first = last = 0 if table.accepting[s] else -1
+        if stop_at_first and first == 0: return first, last
+        rows, accepting, flushes, since = table.rows, table.accepting, table.flushes, table.since_flush
+        for pos, col in enumerate(cols):
+            t = rows[s][col]
+            if t is None:
+                t = table.advance(s, col)
+                if table.flushes != flushes:
+                    if since < LAZY_DFA_BAILOUT * table.max_states:
+                        table.since_flush = 0
+                        return self._simulate(table, table.masks[t], cols, pos, first, last, stop_at_first)
+                    rows, accepting, flushes, since = table.rows, table.accepting, table.flushes, 0
+            s = t
+            since += 1
+            if accepting[s]:
+                last = pos + 1
+                if first < 0:
+                    first = last
+                    if stop_at_first: break
+        table.since_flush = since
+        return first, last
+
+    def _simulate(self, table, mask, cols, pos, first, last, stop_at_first):
+        # NFA simulation from mask, which is the state after reading cols[pos].
+        self.fallbacks += 1
+        accept_mask = table.accept_mask
+        for i in range(pos, len(cols)):
+            if i > pos: mask = table.target(mask, cols[i])
+            if mask & accept_mask:
+                last = i + 1
+                if first < 0:
+                    first = last
+                    if stop_at_first: break
+        return first, last
+
+    def match(self, text):
+        with self._lock:
+            first, last = self._scan(self.forward, self.encode(text), False)
+        return last == len(text)
+
+    def search(self, text):
+        # Earliest-ending match, extended to its leftmost start: one forward pass to find
+        # the end, one backward pass from there over the reversed NFA.
+        cols = self.encode(text)
+        with self._lock:
+            end, _ = self._scan(self.unanchored, cols, True)
+            if end < 0: return None
+            _, length = self._scan(self.backward, cols[end - 1::-1] if end else [], False)
+        return end - length, end
+
+    def cost(self):
+        # Rough bytes: mask, id entry and row per cached state.
+        return sum(len(t.masks) * (120 + 8 * len(t.step)) for t in (self.forward, self.unanchored, self.backward))
+
+    def stats(self):
+        return {"forward": self.forward.stats(), "unanchored": self.unanchored.stats(), "backward": self.backward.stats(),
+                "nfa_fallbacks": self.fallbacks}
+
+
+def match_batch(lazy, strings, mode="match"):
+    # Same shape as CompiledDFA.run_batch; search mode gives each string's match span or null.
+    started = time.perf_counter()
+    if mode == "search":
+        spans = [lazy.search(text) for text in strings]
+        out = {"matched": [span is not None for span in spans], "spans": [list(span) if span else None for span in spans]}
+    else:
+        out = {"accepted": [lazy.match(text) for text in strings]}
+    elapsed = time.perf_counter() - started
+    symbols = sum(map(len, strings))
+    out["stats"] = {
+        "strings": len(strings), "symbols": symbols, "time_ms": round(elapsed * 1000, 3),
+        "symbols_per_second": round(symbols / elapsed) if elapsed > 0 else None, "cache": lazy.stats(),
+    }
+    return out
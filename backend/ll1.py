@@ -0,0 +1,128 @@
+import time
+
+from artifacts import TableCache
+from grammar import GrammarProcessor
+from metrics import gauge, stage
+
+# ==============================================================================
+# LL(1) TABLE - production numbers per (non-terminal, terminal) cell
+# ==============================================================================
+def ll1_table(processor, first_sets, follow_sets):
+    table = {}
+    for pid, (head, body) in enumerate(processor.productions):
+        row = table.setdefault(head, {})
+        first_of_body = set()
+        for symbol in body:
+            sym_first = first_sets.get(symbol, {symbol})
+            first_of_body.update(sym_first - {'epsilon'})
+            if 'epsilon' not in sym_first: break
+        else: first_of_body.add('epsilon')
+
+        lookaheads = list(first_of_body - {'epsilon'})
+        if 'epsilon' in first_of_body: lookaheads += list(follow_sets[head])
+        for terminal in lookaheads:
+            if terminal in row: raise ValueError(f"Conflict at ({head}, {terminal})")
+            row[terminal] = pid
+    return table
+
+
+def production_str(head, body):
+    return f"{head} -> {' '.join(body) if body else 'epsilon'}"
+
+
+# The cached artifact: everything the endpoint reports and the runtime needs, JSON-able.
+def ll1_analysis(grammar, kind="ll1"):
+    with stage("grammar_parse"):
+        processor = GrammarProcessor(grammar)
+    with stage("first_follow"):
+        first_sets = processor.compute_first_sets()
+        follow_sets = processor.compute_follow_sets(first_sets)
+    with stage("parse_table"):
+        table = ll1_table(processor, first_sets, follow_sets)
+    gauge("table_cells", sum(map(len, table.values())))
+    return {
+        "productions": [[h, b] for h, b in processor.productions],
+        "start": processor.start_symbol,
+        "terminals": sorted(processor.terminals), "non_terminals": sorted(processor.non_terminals),
+        "first_sets": {k: sorted(v) for k, v in first_sets.items()},
+        "follow_sets": {k: sorted(v) for k, v in follow_sets.items()},
+        "table": table,
+    }
+
+
+# ==============================================================================
+# COMPILED LL(1) PARSER - integer symbol ids, predictive stack machine
+# ==============================================================================
+# Terminals take ids 0..T-1 ('$' included), non-terminals T and up. Bodies are
+# stored reversed so a prediction is a single stack.extend. Input tokens are looked
+# up without '$': a literal "$" token is unknown, not end of input.
+LL1_CACHE_SIZE = 256
+
+
+class CompiledLL1:
+    def __init__(self, analysis):
+        productions = analysis["productions"]
+        terminals = sorted(set(analysis["terminals"]) | {'$'})
+        non_terminals = analysis["non_terminals"]
+        self.terminals = terminals
+        self.non_terminals = non_terminals
+        self.terminal_id = {t: i for i, t in enumerate(terminals)}
+        nt_id = {nt: len(terminals) + i for i, nt in enumerate(non_terminals)}
+        symbol_id = {**self.terminal_id, **nt_id}
+        self.eof = self.terminal_id['$']
+        self.input_id = {t: i for t, i in self.terminal_id.items() if t != '$'}
+        self.start = nt_id[analysis["start"]]
+        self.productions = [production_str(h, b) for h, b in productions]
+        self.lhs = [nt_id[h] for h, _ in productions]
+        self.rbodies = [tuple(symbol_id[s] for s in reversed(b)) for _, b in productions]
+        self.rows = [[-1] * len(terminals) for _ in non_terminals]
+        for head, row in analysis["table"].items():
+            for terminal, pid in row.items():
+                self.rows[nt_id[head] - len(terminals)][self.terminal_id[terminal]] = pid
+
+    def expected(self, top):
+        if top < len(self.terminals): return [self.terminals[top]]
+        row = self.rows[top - len(self.terminals)]
+        return [self.terminals[t] for t, pid in enumerate(row) if pid >= 0]
+
+    def parse(self, tokens, derivation=False):
+        # unknown tokens map to -1, which matches no terminal and no table column
+        input_id = self.input_id
+        ids = [input_id.get(tok, -1) for tok in tokens]
+        ids.append(self.eof)
+        rows, rbodies, n_terms, eof = self.rows, self.rbodies, len(self.terminals), self.eof
+        steps = [] if derivation else None
+        stack = [eof, self.start]
+        pos, tok = 0, ids[0]
+        while True:
+            top = stack.pop()
+            if top < n_terms:
+                if top != tok: break
+                if tok == eof:
+                    out = {"accepted": True}
+                    if derivation: out["derivation"] = steps
+                    return out
+                pos += 1
+                tok = ids[pos]
+                continue
+            pid = rows[top - n_terms][tok] if tok >= 0 else -1
+            if pid < 0: break
+            stack.extend(rbodies[pid])
+            if derivation: steps.append(pid)
+        out = {"accepted": False, "error": {
+            "position": pos, "token": tokens[pos] if pos < len(tokens) else '$', "expected": self.expected(top),
+        }}
+        if derivation: out["derivation"] = steps
+        return out
+
+    def parse_batch(self, inputs, derivation=False):
+        started = time.perf_counter()
+        results = [self.parse(tokens, derivation) for tokens in inputs]
+        elapsed = time.perf_counter() - started
+        return results, {
+            "inputs": len(inputs), "tokens": sum(map(len, inputs)),
+            "accepted": sum(r["accepted"] for r in results), "time_ms": round(elapsed * 1000, 3),
+        }
+
+
+ll1_tables = TableCache(ll1_analysis, CompiledLL1, ("ll1",), LL1_CACHE_SIZE)
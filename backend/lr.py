@@ -0,0 +1,366 @@
+import time
+from collections import defaultdict
+
+from artifacts import TableCache
+from grammar import EPSILON, GrammarProcessor, propagate_masks
+from metrics import gauge, stage
+
+# ==============================================================================
+# LR(0) AUTOMATON - integer items, closures keyed by kernel
+# ==============================================================================
+# Item ids are offset[prod] + dot, so advancing the dot is item + 1. States are
+# identified by their sorted kernel; a closure is the kernel plus the precomputed
+# leftmost-expansion items of every non-terminal that follows a dot.
+class LR0Automaton:
+    def __init__(self, processor, build=True):
+        # processor must be built with is_slr=True: production 0 is the augmented S' -> S.
+        # With build=False the states are only produced as discover() is iterated.
+        self.processor = processor
+        self.productions = [(h, tuple(b)) for h, b in processor.productions]
+        self.non_terminals = processor.non_terminals
+
+        self.item_prod, self.item_dot, self.item_next = [], [], []
+        self.offset = []
+        self.by_head = defaultdict(list)
+        # Reported production number: index among the original productions, with a
+        # repeated production sharing the number of its first occurrence.
+        first_seen = {}
+        self.prod_number = [first_seen.setdefault(p, pid - 1) for pid, p in enumerate(self.productions)]
+        for pid, (head, body) in enumerate(self.productions):
+            self.offset.append(len(self.item_prod))
+            self.by_head[head].append(pid)
+            for dot in range(len(body) + 1):
+                self.item_prod.append(pid)
+                self.item_dot.append(dot)
+                self.item_next.append(body[dot] if dot < len(body) else None)
+
+        self._expansions = {}
+        self.kernels = []       # state id -> sorted tuple of kernel items
+        self.closures = []      # state id -> sorted tuple of all items
+        self.transitions = []   # state id -> {symbol: target state id}, in first-seen symbol order
+        if build:
+            for _ in self.discover(): pass
+
+    def expansion(self, nt):
+        # Initial items of every production reachable from nt by leftmost expansion.
+        cached = self._expansions.get(nt)
+        if cached is not None: return cached
+        seen, stack, items = {nt}, [nt], []
+        while stack:
+            for pid in self.by_head.get(stack.pop(), ()):
+                item = self.offset[pid]
+                items.append(item)
+                sym = self.item_next[item]
+                if sym in self.non_terminals and sym not in seen:
+                    seen.add(sym)
+                    stack.append(sym)
+        cached = self._expansions[nt] = frozenset(items)
+        return cached
+
+    def closure(self, kernel):
+        items = set(kernel)
+        for item in kernel:
+            sym = self.item_next[item]
+            if sym in self.non_terminals: items |= self.expansion(sym)
+        return tuple(sorted(items))
+
+    def discover(self):
+        # Yields each state id once its closure and transitions are known (BFS order).
+        start = (self.offset[0],)
+        state_of = {start: 0}
+        self.kernels.append(start)
+        i = 0
+        while i < len(self.kernels):
+            items = self.closure(self.kernels[i])
+            self.closures.append(items)
+            successors = {}
+            for item in items:
+                sym = self.item_next[item]
+                if sym is not None: successors.setdefault(sym, []).append(item + 1)
+            row = {}
+            for sym, kernel in successors.items():
+                kernel = tuple(kernel)  # already sorted: items are visited in order
+                target = state_of.get(kernel)
+                if target is None:
+                    target = state_of[kernel] = len(self.kernels)
+                    self.kernels.append(kernel)
+                row[sym] = target
+            self.transitions.append(row)
+            yield i
+            i += 1
+
+    def item_tuple(self, item):
+        head, body = self.productions[self.item_prod[item]]
+        return head, body, self.item_dot[item]
+
+    def format_items(self, i):
+        lines = []
+        for head, body, dot in sorted(self.item_tuple(item) for item in self.closures[i]):
+            lines.append(f"{head} -> {' '.join(body[:dot])} . {' '.join(body[dot:]) if dot < len(body) else ''}")
+        return lines
+
+    def format_item_sets(self):
+        return {f"I{i}": self.format_items(i) for i in range(len(self.closures))}
+
+
+# ==============================================================================
+# ACTION/GOTO TABLES - production numbers exclude S' -> S
+# ==============================================================================
+# lookahead(state, prod) gives the terminals a completed item reduces on. Without a
+# conflicts list the first conflict raises; with one, every conflicting cell is
+# recorded and resolved the yacc way: shift (or accept) over reduce, then the
+# lowest-numbered production.
+def parse_tables(automaton, lookahead, conflicts=None):
+    terminals = automaton.processor.terminals
+    action_table = defaultdict(dict)
+    goto_table = defaultdict(dict)
+    for i, items in enumerate(automaton.closures):
+        row = automaton.transitions[i]
+        candidates = defaultdict(list)
+        for item in items:
+            symbol = automaton.item_next[item]
+            if symbol is not None:
+                if symbol in terminals: candidates[symbol].append(f"S{row[symbol]}")
+                continue
+            pid = automaton.item_prod[item]
+            if pid == 0:
+                candidates['$'].append("Accept")
+                continue
+            for term in lookahead(i, pid):
+                candidates[term].append(f"R{automaton.prod_number[pid]}")
+        actions = {}
+        for term, options in candidates.items():
+            options = sorted(set(options), key=lambda a: (a[0] == 'R', int(a[1:]) if a[0] == 'R' else 0))
+            if len(options) > 1:
+                kind = "Reduce-Reduce" if options[0][0] == 'R' else "Shift-Reduce"
+                if conflicts is None: raise ValueError(f"{kind} conflict at state {i} on '{term}'")
+                conflicts.append({"state": i, "symbol": term, "type": kind.lower(), "actions": options, "chosen": options[0]})
+            actions[term] = options[0]
+        if actions: action_table[i] = actions
+        for symbol, target in row.items():
+            if symbol in automaton.non_terminals: goto_table[i][symbol] = target
+    return action_table, goto_table
+
+
+def slr_tables(automaton, follow_sets):
+    productions = automaton.productions
+    return parse_tables(automaton, lambda state, pid: follow_sets[productions[pid][0]])
+
+
+def table_response(analysis):
+    # Merge tables for frontend
+    full_table = defaultdict(dict)
+    for state, actions in analysis["action"].items():
+        full_table[state].update(actions)
+    for state, gotos in analysis["goto"].items():
+        full_table[state].update(gotos)
+    return {
+        "item_sets": analysis["item_sets"],
+        "parse_table": dict(full_table),
+        "productions": [f"{h} -> {' '.join(b) if b else 'epsilon'}" for h,b in analysis["productions"][1:]],
+        "terminals": sorted(set(analysis["terminals"]) | {'$'}),
+        "non_terminals": sorted(set(analysis["non_terminals"]) - {analysis["start"]})
+    }
+
+
+# ==============================================================================
+# LALR(1) LOOKAHEADS - DeRemer & Pennello over the LR(0) automaton
+# ==============================================================================
+# Nodes are non-terminal transitions (p, A). Read(p, A) is DR(p, A) closed under
+# 'reads', Follow(p, A) is Read closed under 'includes', both solved as bitmask
+# dataflow over the SCC condensation; a reduction's lookahead is the union of Follow
+# over its 'lookback' transitions.
+def lalr_lookaheads(automaton, first_sets):
+    processor = automaton.processor
+    symbols, bit = processor.terminal_index()
+    non_terminals = automaton.non_terminals
+    nullable = {nt for nt, first in first_sets.items() if EPSILON in first}
+    trans = automaton.transitions
+    nodes = [(p, sym) for p, row in enumerate(trans) for sym in row if sym in non_terminals]
+
+    direct, reads = {}, []
+    for node in nodes:
+        p, nt = node
+        r = trans[p][nt]
+        mask = 0
+        for sym in trans[r]:
+            if sym not in non_terminals: mask |= bit[sym]
+            elif sym in nullable: reads.append(((r, sym), node))
+        direct[node] = mask
+    # S' -> S is followed by end of input.
+    direct[(0, automaton.productions[0][1][0])] |= bit['$']
+    read = propagate_masks(nodes, direct, reads)
+
+    includes, lookback = [], defaultdict(list)
+    for node in nodes:
+        p, head = node
+        for pid in automaton.by_head[head]:
+            body = automaton.productions[pid][1]
+            path, q = [], p
+            for sym in body:
+                path.append((q, sym))
+                q = trans[q][sym]
+            lookback[(q, pid)].append(node)
+            for step in reversed(path):
+                if step[1] in non_terminals: includes.append((node, step))
+                if step[1] not in nullable: break
+    follow = propagate_masks(nodes, read, includes)
+
+    lookaheads = {}
+    for key, sources in lookback.items():
+        mask = 0
+        for node in sources: mask |= follow[node]
+        lookaheads[key] = mask
+    return lookaheads, symbols
+
+
+def lalr_tables(automaton, first_sets, conflicts):
+    lookaheads, symbols = lalr_lookaheads(automaton, first_sets)
+    unmask = automaton.processor.unmask
+    return parse_tables(automaton, lambda state, pid: unmask(lookaheads.get((state, pid), 0), symbols), conflicts)
+
+
+# The cached artifact for kind "slr" or "lalr"; state keys are strings, as in the response.
+def lr_analysis(grammar, kind="slr"):
+    with stage("grammar_parse"):
+        processor = GrammarProcessor(grammar, is_slr=True)
+    with stage("lr0_items"):
+        automaton = LR0Automaton(processor)
+    return automaton_analysis(automaton, kind)
+
+
+# The rest of lr_analysis, for a caller that already has the (fully discovered) automaton.
+def automaton_analysis(automaton, kind="slr"):
+    processor = automaton.processor
+    with stage("first_follow"):
+        first_sets = processor.compute_first_sets()
+        # FOLLOW of every original non-terminal is the same with or without the S' -> S augmentation.
+        follow_sets = processor.compute_follow_sets(first_sets) if kind != "lalr" else None
+    conflicts = []
+    with stage("parse_table"):
+        if kind == "lalr":
+            action_table, goto_table = lalr_tables(automaton, first_sets, conflicts)
+        else:
+            action_table, goto_table = slr_tables(automaton, follow_sets)
+    gauge("item_sets", len(automaton.closures))
+    gauge("table_cells", sum(map(len, action_table.values())) + sum(map(len, goto_table.values())))
+    return {
+        "productions": [[h, list(b)] for h, b in automaton.productions],
+        "start": processor.start_symbol,
+        "terminals": sorted(processor.terminals), "non_terminals": sorted(processor.non_terminals),
+        "states": len(automaton.closures),
+        "item_sets": automaton.format_item_sets(),
+        "action": {str(k): v for k, v in action_table.items()},
+        "goto": {str(k): v for k, v in goto_table.items()},
+        "conflicts": conflicts,
+    }
+
+
+# ==============================================================================
+# COMPILED LR PARSER - dense integer action/goto rows, shift-reduce loop
+# ==============================================================================
+# Action codes: 0 error, s + 1 shift to state s, -(p + 1) reduce by augmented
+# production p. Reducing by p = 0 (S' -> S) is accept, i.e. code -1. As in the LL(1)
+# runtime, a literal "$" input token is unknown rather than end of input.
+LR_CACHE_SIZE = 256
+
+
+class CompiledLR:
+    def __init__(self, analysis):
+        self.terminals = sorted(set(analysis["terminals"]) | {'$'})
+        self.non_terminals = analysis["non_terminals"]
+        self.terminal_id = {t: i for i, t in enumerate(self.terminals)}
+        nt_id = {nt: i for i, nt in enumerate(self.non_terminals)}
+        self.eof = self.terminal_id['$']
+        self.input_id = {t: i for t, i in self.terminal_id.items() if t != '$'}
+        productions = analysis["productions"]
+        self.productions = [f"{h} -> {' '.join(b) if b else 'epsilon'}" for h, b in productions[1:]]
+        self.lengths = [len(b) for _, b in productions]
+        self.lhs = [nt_id[h] for h, _ in productions]
+        symbol_id = {**self.terminal_id, **{nt: len(self.terminals) + i for nt, i in nt_id.items()}}
+        self.rhs = [tuple(symbol_id[s] for s in b) for _, b in productions]
+
+        n_states = analysis["states"]
+        self.action = [[0] * len(self.terminals) for _ in range(n_states)]
+        self.goto = [[-1] * len(self.non_terminals) for _ in range(n_states)]
+        for state, actions in analysis["action"].items():
+            row = self.action[int(state)]
+            for term, action in actions.items():
+                if action == "Accept": code = -1
+                elif action[0] == 'S': code = int(action[1:]) + 1
+                else: code = -(int(action[1:]) + 2)  # R<n> numbers exclude S' -> S
+                row[self.terminal_id[term]] = code
+        for state, gotos in analysis["goto"].items():
+            row = self.goto[int(state)]
+            for nt, target in gotos.items(): row[nt_id[nt]] = target
+
+    def expected(self, state):
+        return [self.terminals[t] for t, code in enumerate(self.action[state]) if code]
+
+    def describe(self, code):
+        if code > 0: return f"S{code - 1}"
+        if code == -1: return "Accept"
+        return f"R{-code - 2}"
+
+    def parse(self, tokens):
+        input_id = self.input_id
+        ids = [input_id.get(tok, -1) for tok in tokens]
+        ids.append(self.eof)
+        action, goto, lengths, lhs = self.action, self.goto, self.lengths, self.lhs
+        stack = [0]
+        pos, tok = 0, ids[0]
+        while True:
+            code = action[stack[-1]][tok] if tok >= 0 else 0
+            if code > 0:
+                stack.append(code - 1)
+                pos += 1
+                tok = ids[pos]
+            elif code < -1:
+                p = -code - 1
+                if lengths[p]: del stack[-lengths[p]:]
+                stack.append(goto[stack[-1]][lhs[p]])
+            elif code == -1:
+                return {"accepted": True}
+            else:
+                return self._error(tokens, pos, stack[-1])
+
+    def parse_traced(self, tokens):
+        # Same loop as parse, recording (state stack, lookahead, action) before every step.
+        input_id = self.input_id
+        ids = [input_id.get(tok, -1) for tok in tokens]
+        ids.append(self.eof)
+        stack, trace = [0], []
+        pos, tok = 0, ids[0]
+        while True:
+            code = self.action[stack[-1]][tok] if tok >= 0 else 0
+            trace.append({"stack": list(stack), "lookahead": tokens[pos] if pos < len(tokens) else '$', "action": self.describe(code) if code else "Error"})
+            if code > 0:
+                stack.append(code - 1)
+                pos += 1
+                tok = ids[pos]
+            elif code < -1:
+                p = -code - 1
+                if self.lengths[p]: del stack[-self.lengths[p]:]
+                stack.append(self.goto[stack[-1]][self.lhs[p]])
+            elif code == -1:
+                return {"accepted": True, "trace": trace}
+            else:
+                return dict(self._error(tokens, pos, stack[-1]), trace=trace)
+
+    def _error(self, tokens, pos, state):
+        return {"accepted": False, "error": {
+            "position": pos, "token": tokens[pos] if pos < len(tokens) else '$', "state": state, "expected": self.expected(state),
+        }}
+
+    def parse_batch(self, inputs, trace=False):
+        started = time.perf_counter()
+        parse = self.parse_traced if trace else self.parse
+        results = [parse(tokens) for tokens in inputs]
+        elapsed = time.perf_counter() - started
+        return results, {
+            "inputs": len(inputs), "tokens": sum(map(len, inputs)),
+            "accepted": sum(r["accepted"] for r in results), "time_ms": round(elapsed * 1000, 3),
+        }
+
+
+lr_tables = TableCache(lr_analysis, CompiledLR, ("slr", "lalr"), LR_CACHE_SIZE)
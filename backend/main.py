@@ -1,178 +1,213 @@
 
-import base64
-import io
-import re
-from fastapi import FastAPI, HTTPException
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Literal, Optional, Union
+from fastapi import FastAPI, Form, HTTPException, Response, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from collections import defaultdict, deque
 
-# External libraries
-import networkx as nx
-import matplotlib.pyplot as plt
-from automata.fa.nfa import NFA
-from automata.fa.dfa import DFA
+import admission
+from admission import guarded_determinize
+from artifacts import artifact_store
+from core import Automaton
+from derivatives import cached_regex_to_dfa, derivative_dfas
+from determinize import LimitExceeded
+from keywords import cached_keywords, keyword_automata, scan_batch, stream_scan
+from ll1 import CompiledLL1, ll1_analysis, ll1_tables, production_str
+from lr import CompiledLR, lr_analysis, lr_tables, table_response
+from metrics import TimingMiddleware, gauge, registry, stage
+from minimize import dfa_from_json, minimize_json, minimize_automaton
+from regex_cache import regex_cache
+from simulate import CompiledDFA, stream_membership
+from stream import SSE_HEADERS, dfa_events, lr_events
+from tables import compact_ll1, compact_lr
+from render import GRAPH_MEDIA_TYPES, RenderError, graph_spec, render_service
 
 # ==============================================================================
 # 1. PYDANTIC MODELS
 # ==============================================================================
-class DfaStringInput(BaseModel):
+# format picks what graph_image holds: a PNG data URI, SVG markup, DOT source, or layout JSON.
+# With inline=False graph_image is null and the graph is fetched from graph_url when needed.
+class GraphOptions(BaseModel):
+    format: Literal["png", "svg", "dot", "layout"] = "png"
+    inline: bool = True
+
+class DfaStringInput(GraphOptions):
     alphabet: str
     accept_string: str
+    minimize: bool = False
 
-class NfaRegexInput(BaseModel):
+class NfaRegexInput(GraphOptions):
     regex: str
 
-class NfaJsonInput(BaseModel):
+# alphabet defaults to the symbols the regex spells out; '.' and [^...] range over it.
+class RegexDfaInput(GraphOptions):
+    regex: str
+    alphabet: Optional[str] = None
+    minimize: bool = False
+
+# mode=exact accepts just the keywords; mode=search accepts any string ending in one (the
+# Aho-Corasick DFA). Unflattened, search returns the trie and its failure links instead.
+class KeywordDfaInput(GraphOptions):
+    keywords: list[str]
+    alphabet: Optional[str] = None
+    mode: Literal["exact", "search"] = "search"
+    flatten: bool = True
+
+class KeywordScanInput(BaseModel):
+    keywords: list[str]
+    texts: list[str]
+
+class NfaJsonInput(GraphOptions):
     nfa: dict
+    minimize: bool = False
+
+class DfaJsonInput(GraphOptions):
+    dfa: dict
 
+# encoding=compact swaps parse_table for the packed form described in tables.py.
 class GrammarInput(BaseModel):
     grammar: str
+    encoding: Literal["json", "compact"] = "json"
+
+class LanguageSpec(BaseModel):
+    dfa: Optional[dict] = None
+    regex: Optional[str] = None
+    accept_string: Optional[str] = None
+    alphabet: Optional[str] = None
+
+class DfaBatchInput(LanguageSpec):
+    strings: list[str]
+    return_states: bool = False
+
+# mode=match tests whole strings; mode=search finds the leftmost-starting of the earliest-ending matches.
+class RegexMatchInput(BaseModel):
+    regex: str
+    strings: list[str]
+    mode: Literal["match", "search"] = "match"
+
+# Each input is a list of tokens, or a string of whitespace-separated tokens (the grammar's own format).
+class ParseBatchInput(BaseModel):
+    grammar: Optional[str] = None
+    table_id: Optional[str] = None
+    inputs: list[Union[str, list[str]]]
+
+    def token_lists(self):
+        return [tokens.split() if isinstance(tokens, str) else tokens for tokens in self.inputs]
+
+class LL1ParseInput(ParseBatchInput):
+    derivation: bool = False
+
+class LRParseInput(ParseBatchInput):
+    method: Literal["slr", "lalr"] = "slr"
+    trace: bool = False
+
+# Streaming variants: no graph is rendered, states arrive as Server-Sent Events (see stream.py).
+class NfaStreamInput(BaseModel):
+    nfa: dict
+
+class LRStreamInput(BaseModel):
+    grammar: str
+    method: Literal["slr", "lalr"] = "slr"
 
 # ==============================================================================
 # 2. FASTAPI APP & CORS
 # ==============================================================================
-app = FastAPI(title="Automata & Compiler Lab Backend")
+# automata-lib, NumPy and matplotlib are imported on first use, so a replica serving only
+# grammar traffic never loads them. WARMUP_ON_START=1 pays that cost before the first request
+# instead: it runs one tiny example through every stack and renders it in a worker.
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "0") == "1"
+
+async def warm_up():
+    dfa, _ = build_accept_string_dfa("ab", "ab")
+    CompiledDFA(*dfa.dense()).run_batch(["ab", "ba"])
+    regex_cache.compiled("(a|b)*ab").run_batch(["aab"])
+    CompiledLL1(ll1_analysis("E -> id X\nX -> + id X | epsilon")).parse_batch([["id", "+", "id"]])
+    CompiledLR(lr_analysis("E -> E + id | id", "lalr")).parse_batch([["id", "+", "id"]])
+    await render_service.render(graph_spec(dfa, "warm-up"), "png", inline=True)
+
+@asynccontextmanager
+async def lifespan(app):
+    render_service.start()
+    admission.start()
+    if WARMUP_ON_START: await warm_up()
+    yield
+    render_service.shutdown()
+
+app = FastAPI(title="Automata & Compiler Lab Backend", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
-    allow_methods=["*"], allow_headers=["*"],
+    allow_methods=["*"], allow_headers=["*"], expose_headers=["Server-Timing"],
 )
+# Per-stage timings go back in a Server-Timing header and into /metrics (see metrics.py).
+app.add_middleware(TimingMiddleware)
 
 # ==============================================================================
 # # 3. GRAPH VISUALIZATION LOGIC
 # ==============================================================================
-def generate_automaton_graph_base64(automaton, title="Generated Automaton"):
-    G = nx.DiGraph()
-    G.add_nodes_from(str(s) for s in automaton.states)
-    
-    edge_labels = defaultdict(list)
-    for from_state, transitions in automaton.transitions.items():
-        for symbol, to_states in transitions.items():
-            normalized_to = to_states if isinstance(to_states, (set, list)) else {to_states}
-            for to_state in normalized_to:
-                edge_labels[(str(from_state), str(to_state))].append(str(symbol) if symbol else 'ε')
-
-    for (u, v), labels in edge_labels.items():
-        G.add_edge(u, v, label=",".join(sorted(list(set(labels)))))
-
-    pos = nx.spring_layout(G, seed=42, k=1.5/((len(G.nodes()))**0.5) if len(G.nodes()) > 1 else 1)
-    
-    node_colors, color_map = [], {'start': '#a7c7e7', 'final': '#c1e1c1', 'start_final': '#fdfd96', 'normal': '#ffb347'}
-    
-    for node in G.nodes():
-        is_start = node == str(automaton.initial_state)
-        is_final = node in {str(s) for s in automaton.final_states}
-        if is_start and is_final: node_colors.append(color_map['start_final'])
-        elif is_start: node_colors.append(color_map['start'])
-        elif is_final: node_colors.append(color_map['final'])
-        else: node_colors.append(color_map['normal'])
-        
-    plt.figure(figsize=(max(8, len(G.nodes())), max(6, len(G.nodes())*0.8)))
-    nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=3000, edgecolors='black')
-    nx.draw_networkx_labels(G, pos, font_size=10, font_weight='bold')
-    nx.draw_networkx_edges(G, pos, edgelist=G.edges(), arrows=True, arrowstyle='->', arrowsize=20, connectionstyle='arc3,rad=0.1')
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=nx.get_edge_attributes(G, 'label'), font_color='black', font_size=11)
-
-    plt.title(title, size=16)
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close()
-    buf.seek(0)
-    
-    return "data:image/png;base64," + base64.b64encode(buf.read()).decode('utf-8')
+# Drawing happens in the render worker pool (see render.py) so it never blocks the event loop.
+async def render_graph(automaton, title="Generated Automaton", options=GraphOptions()):
+    try:
+        return await render_service.render(graph_spec(automaton, title), options.format, options.inline)
+    except RenderError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 # ==============================================================================
-# 4. HELPER CLASS FOR PARSING ALGORITHMS - CORRECTED
+# 4. AUTOMATON BUILDERS - shared by the endpoints below
 # ==============================================================================
-class GrammarProcessor:
-    def __init__(self, grammar_str, is_slr=False):
-        self.grammar = defaultdict(list)
-        self.terminals = set()
-        self.non_terminals = set()
-        self.start_symbol = None
-        self.productions = [] # List of (Head, Body) tuples
-        self.is_slr = is_slr
-        self._parse(grammar_str)
-
-    def _parse(self, grammar_str):
-        lines = [line.strip() for line in grammar_str.strip().split('\n') if "->" in line]
-        if not lines: raise ValueError("Grammar is empty or malformed.")
-        
-        original_start_symbol = lines[0].split('->')[0].strip()
-        if self.is_slr:
-            self.start_symbol = f"{original_start_symbol}'"
-            self.non_terminals.add(self.start_symbol)
-            self.productions.append((self.start_symbol, [original_start_symbol]))
-            self.grammar[self.start_symbol].append([original_start_symbol])
-        else:
-            self.start_symbol = original_start_symbol
-
-        for line in lines:
-            head, body_str = line.split('->')
-            head = head.strip()
-            self.non_terminals.add(head)
-            for body_segment in body_str.split('|'):
-                body = [s for s in body_segment.strip().split(' ') if s]
-                processed_body = [] if body == ['epsilon'] else body
-                self.productions.append((head, processed_body))
-                self.grammar[head].append(processed_body)
-
-        all_symbols = {sym for prods in self.grammar.values() for prod in prods for sym in prod}
-        # Assume non-terminals are uppercase or contain '_'
-        self.non_terminals.update({s for s in all_symbols if s[0].isupper() or '_' in s})
-        self.terminals = all_symbols - self.non_terminals
-        if not self.is_slr: self.terminals.add('$')
-    
-    def compute_first_sets(self):
-        first = {nt: set() for nt in self.non_terminals}
-        changed = True
-        while changed:
-            changed = False
-            for head, bodies in self.grammar.items():
-                for body in bodies:
-                    old_len = len(first[head])
-                    if not body: # Epsilon production
-                        first[head].add('epsilon')
-                    else:
-                        for symbol in body:
-                            if symbol in self.terminals:
-                                first[head].add(symbol)
-                                break
-                            # Add all of FIRST(symbol) except epsilon
-                            first[head].update(first[symbol] - {'epsilon'})
-                            if 'epsilon' not in first[symbol]:
-                                break
-                        else: # All symbols in body were nullable
-                            first[head].add('epsilon')
-                    if len(first[head]) > old_len: changed = True
-        return first
-
-    def compute_follow_sets(self, first_sets):
-        follow = {nt: set() for nt in self.non_terminals}
-        follow[self.start_symbol].add('$')
-        changed = True
-        while changed:
-            changed = False
-            for head, body in self.productions:
-                for i, symbol in enumerate(body):
-                    if symbol in self.non_terminals:
-                        old_len = len(follow[symbol])
-                        rest = body[i+1:]
-                        if rest:
-                            first_of_rest = set()
-                            for next_sym in rest:
-                                sym_first = first_sets.get(next_sym, {next_sym})
-                                first_of_rest.update(sym_first - {'epsilon'})
-                                if 'epsilon' not in sym_first: break
-                            else: # All symbols in rest are nullable
-                                first_of_rest.update(follow[head])
-                            follow[symbol].update(first_of_rest)
-                        else: # Symbol is at the end of the production
-                            follow[symbol].update(follow[head])
-                        if len(follow[symbol]) > old_len: changed = True
-        return follow
+def build_accept_string_dfa(alphabet, accept_string):
+    if accept_string and not all(char in alphabet for char in accept_string):
+        raise ValueError("Accept string contains characters not in the defined alphabet.")
+    # A chain q0..qn; every other edge goes to q_trap, which comes last.
+    symbols = sorted(set(alphabet))
+    column = {sym: c for c, sym in enumerate(symbols)}
+    n, trap = len(accept_string), len(accept_string) + 1
+    rows = [[trap] * len(symbols) for _ in range(n + 2)]
+    for i, char in enumerate(accept_string): rows[i][column[char]] = i + 1
+    dfa = Automaton.from_rows([f"q{i}" for i in range(n + 1)] + ["q_trap"], symbols, rows, 1 << n)
+    return dfa, dfa.to_json()
+
+def build_regex_nfa(regex):
+    # Compiled regexes are cached under their normalized AST (see regex_cache.py).
+    _, entry = regex_cache.get(regex)
+    return entry.nfa, entry.nfa_data
+
+# Building the automaton, flattening it and serializing it all run off the event loop.
+def build_keyword_dfa(data):
+    automaton = cached_keywords(data.keywords, data.alphabet)
+    dfa = automaton.dfa(data.mode, data.flatten)
+    if data.flatten or data.mode == "exact":
+        return automaton, dfa, {"dfa": dfa.to_json()}
+    return automaton, dfa, {"trie": automaton.trie_json(), "failure_links": automaton.failure_links()}
+
+# Exactly one of dfa / regex / accept_string (with alphabet) describes the language.
+def compile_language(spec):
+    sources = [name for name in ("dfa", "regex", "accept_string") if getattr(spec, name) is not None]
+    if len(sources) != 1:
+        raise ValueError("Give exactly one of 'dfa', 'regex' or 'accept_string'.")
+    if spec.dfa is not None:
+        return CompiledDFA(*dfa_from_json(spec.dfa))
+    if spec.regex is not None:
+        return regex_cache.compiled(spec.regex)
+    if spec.alphabet is None:
+        raise ValueError("'accept_string' needs an 'alphabet'.")
+    return CompiledDFA(*build_accept_string_dfa(spec.alphabet, spec.accept_string)[0].dense())
+
+# Parse runtimes take a table_id from an earlier response or compile the grammar (cached by content).
+def cached_parser(tables, data, *args):
+    if data.table_id is not None:
+        compiled = tables.get(data.table_id)
+        if compiled is None: raise HTTPException(status_code=404, detail="Parse table is no longer cached; send the grammar again.")
+        return data.table_id, compiled
+    if data.grammar is None: raise HTTPException(status_code=400, detail="Provide a grammar or a table_id.")
+    try:
+        return tables.compile(data.grammar, *args)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # ==============================================================================
 # 5. API ENDPOINTS - LL(1) AND SLR(1) ENDPOINTS CORRECTED
@@ -180,209 +215,264 @@ class GrammarProcessor:
 @app.post("/api/generate-dfa/")
 async def generate_dfa_endpoint(data: DfaStringInput):
     try:
-        if data.accept_string and not all(char in data.alphabet for char in data.accept_string):
-            raise ValueError("Accept string contains characters not in the defined alphabet.")
-        
-        states = {f'q{i}' for i in range(len(data.accept_string) + 1)}
-        start_state = 'q0'
-        final_states = {f'q{len(data.accept_string)}'}
-        trap_state = 'q_trap'
-        states.add(trap_state)
-        
-        transitions = {s: {} for s in states}
-        
-        for i, char in enumerate(data.accept_string):
-            transitions[f'q{i}'][char] = f'q{i+1}'
-        
-        for state in states:
-            for symbol in set(data.alphabet):
-                if symbol not in transitions[state]:
-                    transitions[state][symbol] = trap_state
-        
-        dfa = DFA(states=states, input_symbols=set(data.alphabet), transitions=transitions, initial_state=start_state, final_states=final_states)
-        
-        flat_transitions = { f"{s},{sym}": t for s, trans in dfa.transitions.items() for sym, t in trans.items() }
-        dfa_data = {
-            "states": sorted(list(dfa.states), key=lambda x: (x.startswith('q_'), int(x[1:]) if x[1:].isdigit() else 999)),
-            "alphabet": sorted(list(dfa.input_symbols)), "transitions": flat_transitions,
-            "start_state": dfa.initial_state, "final_states": sorted(list(dfa.final_states)),
-        }
-        return {"dfa": dfa_data, "graph_image": generate_automaton_graph_base64(dfa, f"DFA accepting '{data.accept_string}'")}
+        with stage("build_dfa"):
+            dfa, dfa_data = build_accept_string_dfa(data.alphabet, data.accept_string)
+        extra = {}
+        if data.minimize:
+            with stage("minimize"):
+                dfa = minimize_automaton(dfa)
+            dfa_data, extra = dfa.to_json(), {"state_mapping": dfa.mapping, "minimize_stats": dfa.stats}
+        gauge("dfa_states", len(dfa_data["states"]))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {"dfa": dfa_data, **extra, **await render_graph(dfa, f"DFA accepting '{data.accept_string}'", data)}
+
+@app.post("/api/generate-dfa/keywords")
+async def generate_keyword_dfa_endpoint(data: KeywordDfaInput):
+    try:
+        with stage("build_dfa"):
+            automaton, dfa, result = await run_in_threadpool(build_keyword_dfa, data)
+        gauge("dfa_states", len(automaton.labels))
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    title = f"{'Aho-Corasick DFA' if data.mode == 'search' else 'Trie'} for {len(automaton.keywords)} keyword(s)"
+    return {**result, "stats": automaton.stats, **await render_graph(dfa, title, data)}
 
 @app.post("/api/generate-nfa/")
 async def generate_nfa_endpoint(data: NfaRegexInput):
     try:
-        symbols = set(re.findall(r'[a-zA-Z0-9]', data.regex))
-        nfa = NFA.from_regex(data.regex, input_symbols=symbols if symbols else None)
-        nfa_data = {
-            "states": sorted(list(nfa.states)), "alphabet": sorted(list(nfa.input_symbols)),
-            "transitions": {str(k): {str(sym): sorted(list(v_set)) for sym, v_set in v.items()} for k, v in nfa.transitions.items()},
-            "start_state": nfa.initial_state, "final_states": sorted(list(nfa.final_states)),
-        }
-        return {"nfa": nfa_data, "graph_image": generate_automaton_graph_base64(nfa, f"NFA for regex '{data.regex}'")}
+        with stage("regex_nfa"):
+            nfa, nfa_data = build_regex_nfa(data.regex)
+        gauge("nfa_states", len(nfa_data["states"]))
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid Regular Expression: {e}")
+    return {"nfa": nfa_data, **await render_graph(nfa, f"NFA for regex '{data.regex}'", data)}
+
+# Brzozowski derivatives straight from the regex (see derivatives.py): no NFA, no subset
+# construction. 'expressions' gives the derivative each state stands for.
+@app.post("/api/regex-to-dfa/")
+async def regex_to_dfa_endpoint(data: RegexDfaInput):
+    try:
+        with stage("derivatives"):
+            dfa = await run_in_threadpool(cached_regex_to_dfa, data.regex, data.alphabet)
+        dfa_data, extra = dfa.to_json(), {"stats": dfa.stats, "expressions": dfa.expressions()}
+        if data.minimize:
+            with stage("minimize"):
+                dfa = minimize_automaton(dfa)
+            dfa_data = dfa.to_json()
+            extra.update(state_mapping=dfa.mapping, minimize_stats=dfa.stats)
+        gauge("dfa_states", len(dfa_data["states"]))
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid Regular Expression: {e}")
+    return {"dfa": dfa_data, **extra, **await render_graph(dfa, f"DFA for regex '{data.regex}'", data)}
 
 @app.post("/api/nfa-to-dfa/")
 async def nfa_to_dfa_endpoint(data: NfaJsonInput):
     try:
-        nfa_def = data.nfa
-        formatted_transitions = {s: {k: set(v) for k, v in t.items()} for s, t in nfa_def.get("transitions", {}).items()}
-        for state in nfa_def['states']:
-            if state not in formatted_transitions: formatted_transitions[state] = {}
-            
-        nfa = NFA(
-            states=set(nfa_def['states']), input_symbols=set(nfa_def['alphabet']),
-            transitions=formatted_transitions, initial_state=nfa_def['start_state'],
-            final_states=set(nfa_def['final_states'])
-        )
-        dfa = DFA.from_nfa(nfa)
-
-        def format_state(s): return '{' + ', '.join(sorted(list(s))) + '}' if isinstance(s, frozenset) else str(s)
-        
-        flat_transitions = {f"{format_state(fs)},{sym}": format_state(ts) for fs, tr in dfa.transitions.items() for sym, ts in tr.items()}
-        dfa_data = {
-            "states": sorted([format_state(s) for s in dfa.states]), "alphabet": sorted(list(dfa.input_symbols)),
-            "transitions": flat_transitions, "start_state": format_state(dfa.initial_state),
-            "final_states": sorted([format_state(s) for s in dfa.final_states]),
-        }
-        return {"dfa": dfa_data, "graph_image": generate_automaton_graph_base64(dfa, "Equivalent DFA")}
+        # Off the event loop: a large construction may run (and be killed) in a child process.
+        with stage("determinize"):
+            dfa = await run_in_threadpool(guarded_determinize, data.nfa)
+        extra = {"stats": dfa.stats}
+        if data.minimize:
+            with stage("minimize"):
+                dfa = minimize_automaton(dfa)
+            extra.update(state_mapping=dfa.mapping, minimize_stats=dfa.stats)
+        dfa_data = dfa.to_json()
+        gauge("dfa_states", len(dfa_data["states"]))
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"dfa": dfa_data, **extra, **await render_graph(dfa, "Minimized DFA" if data.minimize else "Equivalent DFA", data)}
+
+# Events: start, one 'state' per DFA state in discovery order, then done (stats) or error.
+@app.post("/api/nfa-to-dfa/stream")
+async def nfa_to_dfa_stream_endpoint(data: NfaStreamInput):
+    try:
+        events = dfa_events(data.nfa)
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/api/dfa/run-batch")
+async def dfa_run_batch_endpoint(data: DfaBatchInput):
+    try:
+        with stage("compile_language"):
+            compiled = await run_in_threadpool(compile_language, data)
+        with stage("run_batch"):
+            return compiled.run_batch(data.strings, data.return_states)
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Lazy DFA (see lazydfa.py): only the subsets the inputs reach are built, in a bounded
+# cache, so regexes whose full DFA would blow up still match in linear time.
+@app.post("/api/regex/match")
+async def regex_match_endpoint(data: RegexMatchInput):
+    try:
+        with stage("regex_nfa"):
+            await run_in_threadpool(regex_cache.lazy, data.regex)
+        with stage("lazy_match"):
+            return await run_in_threadpool(regex_cache.match, data.regex, data.strings, data.mode)
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Multipart upload: 'file' is newline-delimited input, 'spec' is a LanguageSpec as JSON.
+# Results stream back as one NDJSON record per line, then a summary record.
+@app.post("/api/dfa/run-stream")
+async def dfa_run_stream_endpoint(file: UploadFile, spec: str = Form(...), return_states: bool = Form(False)):
+    try:
+        compiled = await run_in_threadpool(compile_language, LanguageSpec.model_validate_json(spec))
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(stream_membership(compiled, file, return_states), media_type="application/x-ndjson")
+
+# Every occurrence of every keyword, overlapping ones included, as [start, end, keyword index].
+# At most KEYWORD_SCAN_MAX_MATCHES are listed; stats.matches always has the full count.
+@app.post("/api/keywords/scan")
+async def keyword_scan_endpoint(data: KeywordScanInput):
+    try:
+        with stage("build_keywords"):
+            automaton = await run_in_threadpool(cached_keywords, data.keywords)
+        with stage("keyword_scan"):
+            return await run_in_threadpool(scan_batch, automaton, data.texts)
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Multipart upload: 'file' is the text, 'keywords' a JSON list. Matches stream back as NDJSON.
+@app.post("/api/keywords/scan-stream")
+async def keyword_scan_stream_endpoint(file: UploadFile, keywords: str = Form(...)):
+    try:
+        words = json.loads(keywords)
+        if not isinstance(words, list) or not all(isinstance(w, str) for w in words):
+            raise ValueError("'keywords' must be a JSON list of strings.")
+        with stage("build_keywords"):
+            automaton = await run_in_threadpool(cached_keywords, words)
+    except LimitExceeded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(stream_scan(automaton, file), media_type="application/x-ndjson")
 
+@app.post("/api/minimize-dfa/")
+async def minimize_dfa_endpoint(data: DfaJsonInput):
+    try:
+        with stage("minimize"):
+            dfa = minimize_json(data.dfa)
+        dfa_data = dfa.to_json()
+        gauge("dfa_states", len(dfa_data["states"]))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"dfa": dfa_data, "state_mapping": dfa.mapping, "stats": dfa.stats, **await render_graph(dfa, "Minimized DFA", data)}
+
+@app.get("/api/graph/{key}/{fmt}")
+async def graph_endpoint(key: str, fmt: Literal["png", "svg", "dot", "layout"]):
+    try:
+        data = await render_service.artifact_by_key(key, fmt)
+    except RenderError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if fmt == "layout": return data
+    # The key is a content hash, so a given URL always serves the same bytes.
+    return Response(content=data, media_type=GRAPH_MEDIA_TYPES[fmt], headers={"Cache-Control": "public, max-age=86400, immutable"})
+
+@app.get("/api/render/stats")
+async def render_stats_endpoint():
+    return render_service.stats()
+
+@app.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    return {"render": render_service.stats(), "regex": regex_cache.stats(), "regex_dfa": derivative_dfas.stats(), "keywords": keyword_automata.stats(), "ll1_tables": ll1_tables.stats(), "lr_tables": lr_tables.stats(), "grammar_artifacts": artifact_store.stats()}
+
+# Prometheus text exposition: request and per-stage latency histograms, last artifact sizes.
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# Analyses are cached per normalized grammar (memory + SQLite, see artifacts.py), so
+# resubmitting a grammar skips straight to formatting the stored result. The results are
+# plain JSON already, so they bypass FastAPI's (slow, for big tables) response encoding.
 @app.post("/api/ll1-parser/")
 async def ll1_parser_endpoint(data: GrammarInput):
     try:
-        processor = GrammarProcessor(data.grammar)
-        first_sets = processor.compute_first_sets()
-        follow_sets = processor.compute_follow_sets(first_sets)
-
-        table = defaultdict(dict)
-        for head, body in processor.productions:
-            first_of_body = set()
-            for symbol in body:
-                sym_first = first_sets.get(symbol, {symbol})
-                first_of_body.update(sym_first - {'epsilon'})
-                if 'epsilon' not in sym_first: break
-            else: first_of_body.add('epsilon')
-            
-            production_str = ' '.join(body) if body else 'epsilon'
-            for terminal in first_of_body - {'epsilon'}:
-                if table[head].get(terminal): raise ValueError(f"Conflict at ({head}, {terminal})")
-                table[head][terminal] = f"{head} -> {production_str}"
-            
-            if 'epsilon' in first_of_body:
-                for terminal in follow_sets[head]:
-                    if table[head].get(terminal): raise ValueError(f"Conflict at ({head}, {terminal})")
-                    table[head][terminal] = f"{head} -> {production_str}"
-        
-        return {
-            "first_sets": {k: sorted(list(v)) for k, v in first_sets.items()},
-            "follow_sets": {k: sorted(list(v)) for k, v in follow_sets.items()},
-            "parse_table": dict(table),
-            "terminals": sorted(list(processor.terminals))
-        }
+        table_id, analysis = ll1_tables.analysis(data.grammar)
+        if data.encoding == "compact":
+            with stage("compact_encode"):
+                parse_table = compact_ll1(ll1_tables.get(table_id, analysis))
+        else:
+            productions = [production_str(h, b) for h, b in analysis["productions"]]
+            parse_table = {head: {t: productions[pid] for t, pid in row.items()} for head, row in analysis["table"].items() if row}
+        return JSONResponse({
+            "first_sets": analysis["first_sets"],
+            "follow_sets": analysis["follow_sets"],
+            "parse_table": parse_table,
+            "terminals": analysis["terminals"],
+            "table_id": table_id
+        })
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def lr_parser_response(data, method):
+    try:
+        table_id, analysis = lr_tables.analysis(data.grammar, method)
+        result = table_response(analysis)
+        if method == "lalr": result["conflicts"] = analysis["conflicts"]
+        if data.encoding == "compact":
+            with stage("compact_encode"):
+                result["parse_table"] = compact_lr(lr_tables.get(table_id, analysis))
+        result["table_id"] = table_id
+        return JSONResponse(result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/slr-parser/")
 async def slr_parser_endpoint(data: GrammarInput):
+    return lr_parser_response(data, "slr")
+
+@app.post("/api/lalr-parser/")
+async def lalr_parser_endpoint(data: GrammarInput):
+    return lr_parser_response(data, "lalr")
+
+# Events: start, one 'item_set' per LR(0) state, then done (the slr/lalr-parser response
+# minus item_sets, with a table_id for /api/lr/parse) or error.
+@app.post("/api/lr-parser/stream")
+async def lr_parser_stream_endpoint(data: LRStreamInput):
     try:
-        processor = GrammarProcessor(data.grammar, is_slr=True)
-        first_sets = processor.compute_first_sets()
-        # The FOLLOW sets needed for reduction are from the *original* start symbol, not the augmented one.
-        original_processor = GrammarProcessor(data.grammar)
-        _, original_follow_sets = get_ll1_details(original_processor)
-
-        productions_tuple = [(h, tuple(b)) for h, b in processor.productions]
-
-        def closure(items):
-            current_items = set(items)
-            worklist = list(items)
-            while worklist:
-                head, body, dot_pos = worklist.pop(0)
-                if dot_pos < len(body) and body[dot_pos] in processor.non_terminals:
-                    nt_to_expand = body[dot_pos]
-                    for p_head, p_body in productions_tuple:
-                        if p_head == nt_to_expand:
-                            new_item = (p_head, tuple(p_body), 0)
-                            if new_item not in current_items:
-                                current_items.add(new_item)
-                                worklist.append(new_item)
-            return frozenset(current_items)
-
-        def goto(item_set, symbol):
-            return closure({(h, b, d + 1) for h, b, d in item_set if d < len(b) and b[d] == symbol})
-
-        initial_item = (processor.start_symbol, tuple(processor.grammar[processor.start_symbol][0]), 0)
-        states = [closure({initial_item})]
-        state_map = {states[0]: 0}
-        transitions = {}
-        
-        queue = deque([states[0]])
-        while queue:
-            current_items = queue.popleft()
-            current_idx = state_map[current_items]
-            all_symbols = processor.terminals | processor.non_terminals
-            
-            for symbol in all_symbols:
-                next_items = goto(current_items, symbol)
-                if next_items:
-                    if next_items not in state_map:
-                        state_map[next_items] = len(states)
-                        states.append(next_items)
-                        queue.append(next_items)
-                    transitions[(current_idx, symbol)] = state_map[next_items]
-
-        action_table = defaultdict(dict)
-        goto_table = defaultdict(dict)
-        
-        for i, state_items in enumerate(states):
-            for head, body, dot_pos in state_items:
-                if dot_pos < len(body): # Shift
-                    symbol = body[dot_pos]
-                    if symbol in processor.terminals:
-                        target = transitions.get((i, symbol))
-                        if target is not None:
-                            action = f"S{target}"
-                            if symbol in action_table[i] and action_table[i][symbol] != action: raise ValueError(f"Shift-Reduce conflict at state {i} on '{symbol}'")
-                            action_table[i][symbol] = action
-                else: # Reduce or Accept
-                    if head == processor.start_symbol: # Accept
-                        action_table[i]['$'] = "Accept"
-                    else: # Reduce
-                        original_prods = [(h, tuple(b)) for h,b in original_processor.productions]
-                        prod_num = original_prods.index((head, body))
-                        for term in original_follow_sets[head]:
-                            action = f"R{prod_num}"
-                            if term in action_table[i] and action_table[i][term] != action: raise ValueError(f"Reduce-Reduce/Shift-Reduce conflict at state {i} on '{term}'")
-                            action_table[i][term] = action
-
-        for (state, symbol), target in transitions.items():
-            if symbol in processor.non_terminals:
-                goto_table[state][symbol] = target
-
-        # Merge tables for frontend
-        full_table = defaultdict(dict)
-        for state, actions in action_table.items():
-            full_table[str(state)].update(actions)
-        for state, gotos in goto_table.items():
-            full_table[str(state)].update(gotos)
-
-        item_sets_formatted = {f"I{i}": [f"{p[0]} -> {' '.join(p[1][:p[2]])} . {' '.join(p[1][p[2]:]) if p[2] < len(p[1]) else ''}" for p in sorted(list(s))] for i, s in enumerate(states)}
-        
-        return {
-            "item_sets": item_sets_formatted,
-            "parse_table": dict(full_table),
-            "productions": [f"{h} -> {' '.join(b) if b else 'epsilon'}" for h,b in original_processor.productions],
-            "terminals": sorted(list(original_processor.terminals)),
-            "non_terminals": sorted(list(original_processor.non_terminals))
-        }
+        events = lr_events(data.grammar, data.method)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/api/ll1/parse")
+async def ll1_parse_endpoint(data: LL1ParseInput):
+    table_id, compiled = cached_parser(ll1_tables, data)
+    with stage("parse_batch"):
+        results, stats = await run_in_threadpool(compiled.parse_batch, data.token_lists(), data.derivation)
+    out = {"table_id": table_id, "results": results, "stats": stats}
+    if data.derivation: out["productions"] = compiled.productions
+    return out
+
+@app.post("/api/lr/parse")
+async def lr_parse_endpoint(data: LRParseInput):
+    table_id, compiled = cached_parser(lr_tables, data, data.method)
+    with stage("parse_batch"):
+        results, stats = await run_in_threadpool(compiled.parse_batch, data.token_lists(), data.trace)
+    return {"table_id": table_id, "results": results, "stats": stats}
 
 
 
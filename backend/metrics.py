@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+# ==============================================================================
+# STAGE TIMING - per-request spans for Server-Timing, Prometheus text for /metrics
+# ==============================================================================
+# Code marks its expensive steps with `with stage("name"):`. Outside a request, or
+# with METRICS_ENABLED=0, stage() returns a shared no-op after one ContextVar lookup,
+# so instrumented hot paths cost next to nothing. Spans measured elsewhere (render
+# workers run in other processes) are added with record_stage().
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_spans = ContextVar("metrics_spans", default=None)
+
+
+class _NoSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("spans", "name", "started")
+
+    def __init__(self, spans, name):
+        self.spans = spans
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.spans.append((self.name, time.perf_counter() - self.started))
+        return False
+
+
+def stage(name):
+    spans = _spans.get()
+    return _NO_SPAN if spans is None else _Span(spans, name)
+
+
+def record_stage(name, seconds):
+    spans = _spans.get()
+    if spans is not None: spans.append((name, seconds))
+
+
+def gauge(name, value):
+    if METRICS_ENABLED: registry.set_gauge(name, value)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}   # (path, status) -> Histogram
+        self.stages = {}     # stage -> Histogram
+        self.gauges = {}     # name -> last value
+
+    def observe_request(self, path, status, seconds, spans):
+        with self._lock:
+            self.requests.setdefault((path, status), Histogram()).observe(seconds)
+            for name, value in spans:
+                self.stages.setdefault(name, Histogram()).observe(value)
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def render(self):
+        lines = []
+        def histogram(metric, entries):
+            for labels, h in entries:
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_labels(**labels, le=bound)} {cumulative}")
+                lines.append(f"{metric}_bucket{_labels(**labels, le='+Inf')} {h.count}")
+                lines.append(f"{metric}_sum{_labels(**labels)} {h.sum:.6f}")
+                lines.append(f"{metric}_count{_labels(**labels)} {h.count}")
+        with self._lock:
+            lines += ["# HELP automata_request_duration_seconds Request latency by route.", "# TYPE automata_request_duration_seconds histogram"]
+            histogram("automata_request_duration_seconds", [({"path": p, "status": s}, h) for (p, s), h in sorted(self.requests.items())])
+            lines += ["# HELP automata_stage_duration_seconds Time spent in each instrumented stage.", "# TYPE automata_stage_duration_seconds histogram"]
+            histogram("automata_stage_duration_seconds", [({"stage": name}, h) for name, h in sorted(self.stages.items())])
+            lines += ["# HELP automata_last_size Size of the most recent artifact of each kind (states, item sets, table cells, bytes).", "# TYPE automata_last_size gauge"]
+            lines += [f"automata_last_size{_labels(kind=name)} {value}" for name, value in sorted(self.gauges.items())]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def server_timing(spans, total):
+    # Repeated stages (e.g. two renders) are summed into one entry, in first-seen order.
+    merged = {}
+    for name, seconds in spans:
+        merged[name] = merged.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+# Plain ASGI rather than BaseHTTPMiddleware: the endpoint runs in this same task, so the
+# span list set here is the one stage() sees, and no extra task is spawned per request.
+class TimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        spans, started, status = [], time.perf_counter(), [500]
+        token = _spans.set(spans)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                header = server_timing(spans, time.perf_counter() - started).encode()
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"server-timing", header)])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _spans.reset(token)
+            route = scope.get("route")
+            registry.observe_request(route.path if route is not None else "unmatched", status[0], time.perf_counter() - started, spans)
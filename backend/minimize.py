@@ -0,0 +1,137 @@
+import time
+from collections import defaultdict, deque
+
+from core import Automaton
+
+# ==============================================================================
+# DFA MINIMIZATION - Hopcroft partition refinement, O(n·k·log n)
+# ==============================================================================
+# Works on the integer form used by determinize.py: table[state][column] -> state,
+# with the start state first. Partial DFAs get an implicit sink that is dropped
+# again afterwards unless it merged with a real dead state.
+
+def _reachable(table, start):
+    seen, queue = {start}, deque([start])
+    while queue:
+        for t in table[queue.popleft()]:
+            if t not in seen:
+                seen.add(t)
+                queue.append(t)
+    return seen
+
+
+def hopcroft(table, finals, start=0):
+    # Returns class_of (None for unreachable states) and the number of classes,
+    # with classes numbered in BFS order from the start state.
+    n = len(table)
+    k = len(table[0]) if n else 0
+    live = _reachable(table, start)
+
+    # inverse[c][t] = states that move to t on column c
+    inverse = [defaultdict(list) for _ in range(k)]
+    for s in live:
+        for c, t in enumerate(table[s]):
+            inverse[c][t].append(s)
+
+    blocks = [b for b in ({s for s in live if finals[s]}, {s for s in live if not finals[s]}) if b]
+    block_of = [None] * n
+    for b, members in enumerate(blocks):
+        for s in members: block_of[s] = b
+
+    pending = set()
+    work = []
+    if len(blocks) == 2:
+        smaller = 0 if len(blocks[0]) <= len(blocks[1]) else 1
+        for c in range(k):
+            pending.add((smaller, c))
+            work.append((smaller, c))
+
+    while work:
+        splitter = work.pop()
+        pending.discard(splitter)
+        a, c = splitter
+        inv = inverse[c]
+        touched = defaultdict(list)
+        for t in list(blocks[a]):
+            for s in inv.get(t, ()):
+                touched[block_of[s]].append(s)
+
+        for y, hit in touched.items():
+            if len(hit) == len(blocks[y]): continue
+            # Move the hit states out; cost is proportional to |hit|, not |Y|.
+            new = len(blocks)
+            moved = set(hit)
+            blocks[y] -= moved
+            blocks.append(moved)
+            for s in moved: block_of[s] = new
+            for d in range(k):
+                if (y, d) in pending:
+                    entry = (new, d)
+                else:
+                    entry = (new, d) if len(moved) <= len(blocks[y]) else (y, d)
+                if entry not in pending:
+                    pending.add(entry)
+                    work.append(entry)
+
+    order = {}
+    if start in live:
+        queue = deque([block_of[start]])
+        order[block_of[start]] = 0
+        while queue:
+            for t in table[next(iter(blocks[queue.popleft()]))]:
+                b = block_of[t]
+                if b not in order:
+                    order[b] = len(order)
+                    queue.append(b)
+    class_of = [order[block_of[s]] if s in live else None for s in range(n)]
+    return class_of, len(order)
+
+
+class MinimizedDFA(Automaton):
+    # States are the classes, named after their first member; minimize_table sets
+    # mapping (original state name -> class name, None if unreachable) and stats.
+    __slots__ = ("mapping", "stats")
+
+    def to_json(self):
+        return super().to_json(sort_finals=True)
+
+
+def minimize_table(names, symbols, table, finals, start=0):
+    # names may end with None for an implicit sink added to complete a partial DFA.
+    started = time.perf_counter()
+    class_of, count = hopcroft(table, finals, start)
+
+    members = [[] for _ in range(count)]
+    for s, cls in enumerate(class_of):
+        if cls is not None and names[s] is not None: members[cls].append(s)
+    # Each class is named after its first member in input order; a class holding only the
+    # implicit sink has no named member, disappears, and transitions into it become missing again.
+    kept = [cls for cls in range(count) if members[cls]]
+    renumber = {cls: i for i, cls in enumerate(kept)}
+    class_names = [names[members[cls][0]] for cls in kept]
+    min_table = [[renumber.get(class_of[t]) for t in table[members[cls][0]]] for cls in kept]
+    min_finals = [bool(finals[members[cls][0]]) for cls in kept]
+
+    mapping = {name: (class_names[renumber[cls]] if cls is not None else None) for name, cls in zip(names, class_of) if name is not None}
+    stats = {
+        "original_states": sum(name is not None for name in names), "minimized_states": len(class_names),
+        "unreachable_states": sum(cls is None for name, cls in zip(names, class_of) if name is not None),
+        "time_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+    dfa = MinimizedDFA.from_rows(class_names, symbols, min_table, min_finals)
+    dfa.mapping, dfa.stats = mapping, stats
+    return dfa
+
+
+def dfa_from_json(dfa_def):
+    # The flat {"state,symbol": target} shape the DFA endpoints return, as dense rows.
+    return Automaton.from_json(dfa_def).dense()
+
+
+def minimize_json(dfa_def):
+    return minimize_table(*dfa_from_json(dfa_def))
+
+
+def minimize_automaton(dfa):
+    # Any DFA in the core form (see core.py).
+    return minimize_table(*dfa.dense())
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+
+from admission import check_nfa_size, guarded_determinize
+from cache import LRUCache
+from core import Automaton
+from simulate import CompiledDFA
+
+# ==============================================================================
+# REGEX NORMALIZATION - canonical text of the regex AST, used as the cache key
+# ==============================================================================
+# Mirrors automata-lib's grammar: '|', '&' and '^' share the lowest precedence and
+# associate left, concatenation binds tighter, postfix operators tightest. Groups
+# do not survive into the AST, so only the parentheses precedence needs are printed
+# back, and unescaped whitespace (never a symbol for these endpoints) is dropped.
+INFIX = "|&^"
+POSTFIX = "*+?"
+QUANTIFIER = re.compile(r"\{(-?\d*)(?:,(-?\d*))?\}")
+
+
+def _tokenize(regex):
+    tokens, i = [], 0
+    while i < len(regex):
+        ch = regex[i]
+        if ch.isspace():
+            i += 1
+        elif ch == '\\' and i + 1 < len(regex):
+            tokens.append(('atom', regex[i:i + 2]))
+            i += 2
+        elif ch == '[':
+            j = i + 1
+            while j < len(regex) and regex[j] != ']':
+                j += 2 if regex[j] == '\\' else 1
+            if j >= len(regex): raise ValueError("Unterminated character class.")
+            tokens.append(('atom', regex[i:j + 1]))
+            i = j + 1
+        elif ch == '{' and QUANTIFIER.match(regex, i):
+            match = QUANTIFIER.match(regex, i)
+            tokens.append(('post', match.group()))
+            i = match.end()
+        elif ch in POSTFIX:
+            tokens.append(('post', ch))
+            i += 1
+        elif ch in INFIX:
+            tokens.append(('infix', ch))
+            i += 1
+        elif ch in '()':
+            tokens.append((ch, ch))
+            i += 1
+        else:
+            tokens.append(('atom', ch))
+            i += 1
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        self.pos += 1
+        return self.tokens[self.pos - 1][1]
+
+    def expr(self):
+        node = self.cat()
+        while self.peek() == 'infix':
+            op = self.take()
+            rhs = self.cat()
+            # Runs of the same operator are flattened: a|(b|c) and (a|b)|c are both a|b|c.
+            kids = (node[2] if node[0] == 'bin' and node[1] == op else [node])
+            kids = kids + (rhs[2] if rhs[0] == 'bin' and rhs[1] == op else [rhs])
+            node = ('bin', op, kids)
+        return node
+
+    def cat(self):
+        kids = []
+        while self.peek() in ('atom', '('):
+            kid = self.post()
+            kids.extend(kid[1] if kid[0] == 'cat' else [kid])
+        if not kids: raise ValueError("Empty operand.")
+        return kids[0] if len(kids) == 1 else ('cat', kids)
+
+    def post(self):
+        node = self.group() if self.peek() == '(' else ('atom', self.take())
+        while self.peek() == 'post':
+            node = ('post', self.take(), node)
+        return node
+
+    def group(self):
+        self.take()
+        if self.peek() == ')':
+            self.take()
+            return ('empty',)
+        node = self.expr()
+        if self.peek() != ')': raise ValueError("Unbalanced parentheses.")
+        self.take()
+        return node
+
+
+def _render(node):
+    kind = node[0]
+    if kind == 'atom': return node[1]
+    if kind == 'empty': return '()'
+    if kind == 'post':
+        child = node[2]
+        inner = _render(child)
+        return (inner if child[0] in ('atom', 'empty', 'post') else f"({inner})") + node[1]
+    if kind == 'cat':
+        return ''.join(f"({_render(k)})" if k[0] == 'bin' else _render(k) for k in node[1])
+    # A leading operand of another infix operator needs no parentheses (left
+    # associativity); any later infix operand does.
+    first, rest = node[2][0], node[2][1:]
+    return node[1].join([_render(first)] + [f"({_render(k)})" if k[0] == 'bin' else _render(k) for k in rest])
+
+
+def parse_regex(regex):
+    tokens = _tokenize(regex)
+    parser = _Parser(tokens)
+    node = parser.expr()
+    if parser.pos != len(tokens): raise ValueError("Unbalanced parentheses.")
+    return node
+
+
+def normalize_regex(regex):
+    return _render(parse_regex(regex))
+
+
+# Upper bound on the NFA automata-lib builds for a parsed regex. '&' and '^' are
+# product constructions and counted quantifiers repeat their operand, so nesting them
+# multiplies; both are what make a short regex expensive.
+def _nfa_bound(node):
+    kind = node[0]
+    if kind == 'atom': return 2
+    if kind == 'empty': return 1
+    if kind == 'cat': return sum(_nfa_bound(k) for k in node[1])
+    if kind == 'post':
+        inner = _nfa_bound(node[2])
+        match = QUANTIFIER.fullmatch(node[1])
+        if match is None: return inner + 1
+        low, high = match.group(1), match.group(2)
+        repeats = max(int(low or 0), int(high) if high and high != '-1' else int(low or 0) + 1)
+        return inner * max(repeats, 1) + 1
+    sizes = [_nfa_bound(k) for k in node[2]]
+    if node[1] == '|': return sum(sizes) + 1
+    product = 1
+    for size in sizes: product *= size
+    return product
+
+
+def estimate_nfa_states(regex):
+    return _nfa_bound(parse_regex(regex))
+
+
+# ==============================================================================
+# COMPILED REGEX CACHE - NFA, lazily derived DFA, and serialized JSON per regex
+# ==============================================================================
+REGEX_CACHE_BYTES = int(os.environ.get("REGEX_CACHE_BYTES", 64 << 20))
+
+
+class CompiledRegex:
+    def __init__(self, regex):
+        from automata.fa.nfa import NFA  # pulls in networkx; only pay for it once a regex arrives
+        try:
+            estimate = estimate_nfa_states(regex)
+        except ValueError:
+            estimate = 0  # malformed; automata-lib reports it
+        check_nfa_size(estimate, "regex's NFA")
+        self.regex = regex
+        symbols = set(re.findall(r'[a-zA-Z0-9]', regex))
+        # automata-lib only parses the regex; the NFA is kept in the core form (see core.py).
+        self.nfa = Automaton.from_automata_lib(NFA.from_regex(regex, input_symbols=symbols if symbols else None))
+        self._dfa = None
+        self._compiled = None
+        self._lazy = None
+
+    @property
+    def nfa_data(self):
+        return self.nfa.nfa_json()
+
+    @property
+    def dfa(self):
+        if self._dfa is None: self._dfa = guarded_determinize(self.nfa)
+        return self._dfa
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            dfa = self.dfa
+            self._compiled = CompiledDFA(*dfa.dense())
+        return self._compiled
+
+    @property
+    def lazy(self):
+        # Matches without building the full DFA; see lazydfa.py.
+        if self._lazy is None:
+            from lazydfa import LazyDFA
+            self._lazy = LazyDFA(self.nfa)
+        return self._lazy
+
+    def cost(self):
+        # Rough bytes: the packed NFA plus whatever has been derived from it so far.
+        total = sys.getsizeof(self.regex) + self.nfa.nbytes()
+        if self._dfa is not None: total += self._dfa.stats["peak_memory_bytes"]
+        if self._compiled is not None: total += self._compiled.table.nbytes + self._compiled.column.nbytes
+        if self._lazy is not None: total += self._lazy.cost()
+        return total
+
+
+class RegexCache:
+    def __init__(self, maxcost=REGEX_CACHE_BYTES):
+        self.entries = LRUCache(maxsize=4096, maxcost=maxcost)
+
+    def get(self, regex):
+        try:
+            key = normalize_regex(regex)
+        except ValueError:
+            # Leave malformed input to automata-lib, which produces the user-facing error.
+            key = regex
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = CompiledRegex(key)
+            self.entries.put(key, entry, entry.cost())
+        return key, entry
+
+    def dfa(self, regex):
+        key, entry = self.get(regex)
+        dfa = entry.dfa
+        self.entries.set_cost(key, entry.cost())
+        return dfa
+
+    def compiled(self, regex):
+        key, entry = self.get(regex)
+        compiled = entry.compiled
+        self.entries.set_cost(key, entry.cost())
+        return compiled
+
+    def lazy(self, regex):
+        key, entry = self.get(regex)
+        lazy = entry.lazy
+        self.entries.set_cost(key, entry.cost())
+        return lazy
+
+    def match(self, regex, strings, mode="match"):
+        # Matching fills the lazy DFA's tables, so the entry is re-costed once it is done.
+        from lazydfa import match_batch
+        key, entry = self.get(regex)
+        result = match_batch(entry.lazy, strings, mode)
+        self.entries.set_cost(key, entry.cost())
+        return result
+
+    def stats(self):
+        return self.entries.stats()
+
+
+regex_cache = RegexCache()
@@ -0,0 +1,384 @@
+import asyncio
+import base64
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import LRUCache
+from core import Automaton
+from layout import choose_engine, compute_layout
+from metrics import gauge, record_stage, stage
+
+# ==============================================================================
+# RENDER SERVICE - matplotlib runs in a bounded pool of warmed worker processes
+# ==============================================================================
+# Pyplot keeps global figure state, so rendering is not safe on threads. Each
+# worker is a separate process with the non-interactive Agg backend loaded once
+# at start-up; the event loop only builds a small picklable spec and awaits. A render
+# that outlives RENDER_TIMEOUT gets its pool killed and replaced, so it cannot hold a
+# worker slot forever.
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+RENDER_QUEUE_DEPTH = int(os.environ.get("RENDER_QUEUE_DEPTH", 8))
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", 20))
+GRAPH_FORMATS = ("png", "svg", "dot", "layout")
+GRAPH_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml", "dot": "text/vnd.graphviz", "layout": "application/json"}
+RENDER_CACHE_SIZE = int(os.environ.get("RENDER_CACHE_SIZE", 256))
+# Images are also bounded by their summed size, so a run of large PNGs cannot pin RENDER_CACHE_SIZE of them.
+RENDER_CACHE_BYTES = int(os.environ.get("RENDER_CACHE_BYTES", 128 << 20))
+# Specs and layouts are costed by rough size too: one spec of a huge automaton can outweigh many images.
+RENDER_SPEC_CACHE_BYTES = int(os.environ.get("RENDER_SPEC_CACHE_BYTES", 64 << 20))
+RENDER_LAYOUT_CACHE_BYTES = int(os.environ.get("RENDER_LAYOUT_CACHE_BYTES", 32 << 20))
+# Above RENDER_DETAIL_NODES edge labels are dropped; above RENDER_MAX_NODES only a notice is drawn.
+RENDER_DETAIL_NODES = int(os.environ.get("RENDER_DETAIL_NODES", 80))
+RENDER_MAX_NODES = int(os.environ.get("RENDER_MAX_NODES", 600))
+MAX_FIGURE_INCHES = 40
+# Inherited by the spawned workers, so nothing that imports matplotlib ever probes for a GUI backend.
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+class RenderError(Exception):
+    status_code = 500
+
+class RenderBusy(RenderError):
+    status_code = 429
+
+class RenderTimeout(RenderError):
+    status_code = 504
+
+class RenderNotFound(RenderError):
+    status_code = 404
+
+
+def graph_spec(automaton, title="Generated Automaton"):
+    # Flatten an automaton into plain strings so it can cross the process boundary. The core
+    # form (core.py) does this from its arrays; anything else goes through automata-lib's API.
+    if isinstance(automaton, Automaton): return automaton.graph_spec(title)
+    edge_labels = defaultdict(set)
+    for from_state, transitions in automaton.transitions.items():
+        for symbol, to_states in transitions.items():
+            normalized_to = to_states if isinstance(to_states, (set, frozenset, list)) else {to_states}
+            for to_state in normalized_to:
+                edge_labels[(str(from_state), str(to_state))].add(str(symbol) if symbol else 'ε')
+    return {
+        "title": title,
+        "nodes": [str(s) for s in automaton.states],
+        "edges": [(u, v, ",".join(sorted(labels))) for (u, v), labels in edge_labels.items()],
+        "initial": str(automaton.initial_state),
+        "finals": sorted(str(s) for s in automaton.final_states),
+    }
+
+
+# Rough bytes for the render caches: list slots, tuples and the label strings.
+def spec_bytes(spec):
+    return 200 + sum(64 + len(node) for node in spec["nodes"]) + sum(80 + len(label) for _, _, label in spec["edges"])
+
+
+def layout_bytes(layout):
+    return 64 + 120 * len(layout)
+
+
+# ==============================================================================
+# CANONICAL FORM - content address of an automaton, independent of state names
+# ==============================================================================
+def _refine_colors(n, out, inn, colors):
+    # Colour refinement: split states by the multiset of (label, neighbour colour) until stable.
+    # Ranks come from sorted signatures only, so they do not depend on state names or set order.
+    while True:
+        sigs = [
+            (colors[i], tuple(sorted((l, colors[j]) for l, j in out[i])), tuple(sorted((l, colors[j]) for l, j in inn[i])))
+            for i in range(n)
+        ]
+        ranking = {sig: rank for rank, sig in enumerate(sorted(set(sigs)))}
+        if len(ranking) == len(set(colors)):
+            return colors
+        colors = [ranking[sig] for sig in sigs]
+
+
+# Returns (spec in canonical node order, structure_key, image_key). structure_key covers only
+# the shape (states up to renaming, labelled transitions, start, finals) and keys the layout
+# cache; image_key also covers the drawn state names and title, since those end up in the PNG.
+def canonicalize(spec):
+    nodes = spec["nodes"]
+    n = len(nodes)
+    index = {name: i for i, name in enumerate(nodes)}
+    out, inn = [[] for _ in range(n)], [[] for _ in range(n)]
+    for u, v, label in spec["edges"]:
+        out[index[u]].append((label, index[v]))
+        inn[index[v]].append((label, index[u]))
+
+    finals = set(spec["finals"])
+    initial = index.get(spec["initial"])
+    colors = [(i == initial, name in finals) for i, name in enumerate(nodes)]
+    ranking = {c: rank for rank, c in enumerate(sorted(set(colors)))}
+    colors = _refine_colors(n, out, inn, [ranking[c] for c in colors])
+
+    # BFS from the start state along label-sorted edges; names only break ties between
+    # states refinement proved interchangeable, so the shape is still name-independent.
+    order, seen = [], [False] * n
+    queue = deque([initial]) if initial is not None else deque()
+    if initial is not None: seen[initial] = True
+    while queue:
+        i = queue.popleft()
+        order.append(i)
+        for _, j in sorted(out[i], key=lambda e: (e[0], colors[e[1]], nodes[e[1]])):
+            if not seen[j]:
+                seen[j] = True
+                queue.append(j)
+    order.extend(sorted((i for i in range(n) if not seen[i]), key=lambda i: (colors[i], nodes[i])))
+
+    position = {old: new for new, old in enumerate(order)}
+    edges = sorted((position[index[u]], label, position[index[v]]) for u, v, label in spec["edges"])
+    shape = (n, 0 if initial is not None else -1, sorted(position[index[f]] for f in finals if f in index), edges)
+    structure_key = hashlib.sha1(repr(shape).encode()).hexdigest()
+
+    names = [nodes[i] for i in order]
+    image_key = hashlib.sha1(repr((structure_key, names, spec["title"])).encode()).hexdigest()
+    canonical = dict(spec, nodes=names, edges=[(names[u], names[v], label) for u, label, v in edges])
+    return canonical, structure_key, image_key
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+    # Keep SVG labels as <text> instead of glyph paths; much smaller output.
+    matplotlib.rcParams['svg.fonttype'] = 'none'
+    import matplotlib.pyplot as plt
+    import networkx  # noqa: F401
+    # Draw something tiny so the font cache and text layout paths are hot before the first real request.
+    plt.figure(figsize=(1, 1))
+    plt.text(0.5, 0.5, "q0")
+    plt.savefig(io.BytesIO(), format='png')
+    plt.close('all')
+
+
+def _render_placeholder(spec, fmt):
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(8, 2))
+    plt.axis('off')
+    plt.text(0.5, 0.5, f"{spec['title']}\n{len(spec['nodes'])} states is too many to draw (limit {RENDER_MAX_NODES}).",
+             ha='center', va='center', size=14)
+    buf = io.BytesIO()
+    plt.savefig(buf, format=fmt, bbox_inches='tight')
+    plt.close('all')
+    return buf.getvalue()
+
+
+# Returns (image bytes, layout, worker-side stage timings); the timings travel back with
+# the result because the request's span collector does not exist in this process.
+def _render_figure(spec, layout=None, fmt='png'):
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
+    started = time.perf_counter()
+    n = len(spec["nodes"])
+    if n > RENDER_MAX_NODES:
+        return _render_placeholder(spec, fmt), None, {"render_encode": time.perf_counter() - started}
+
+    G = nx.DiGraph()
+    G.add_nodes_from(spec["nodes"])
+    for u, v, label in spec["edges"]:
+        G.add_edge(u, v, label=label)
+
+    if layout is None: layout = compute_layout(spec)
+    pos = dict(zip(spec["nodes"], layout))
+    laid_out = time.perf_counter()
+
+    node_colors, color_map = [], {'start': '#a7c7e7', 'final': '#c1e1c1', 'start_final': '#fdfd96', 'normal': '#ffb347'}
+    finals = set(spec["finals"])
+    for node in G.nodes():
+        is_start = node == spec["initial"]
+        is_final = node in finals
+        if is_start and is_final: node_colors.append(color_map['start_final'])
+        elif is_start: node_colors.append(color_map['start'])
+        elif is_final: node_colors.append(color_map['final'])
+        else: node_colors.append(color_map['normal'])
+
+    # Size the figure from the layout extent, then cap it and shrink the drawing to fit
+    # instead of letting the canvas (and PNG) grow with the state count.
+    if choose_engine(spec) == "spring":
+        width, height = max(8, n), max(6, n*0.8)
+    else:
+        xs, ys = [p[0] for p in layout], [p[1] for p in layout]
+        width, height = max(8, 2.2 * (max(xs) - min(xs) + 1)), max(6, 1.4 * (max(ys) - min(ys) + 1))
+    scale = min(1.0, MAX_FIGURE_INCHES / width, MAX_FIGURE_INCHES / height)
+    detailed = n <= RENDER_DETAIL_NODES and scale >= 0.4
+
+    plt.figure(figsize=(min(width, MAX_FIGURE_INCHES), min(height, MAX_FIGURE_INCHES)))
+    nx.draw_networkx_nodes(G, pos, node_color=node_colors, node_size=max(30, 3000 * scale**2), edgecolors='black')
+    nx.draw_networkx_labels(G, pos, font_size=max(3, 10 * scale), font_weight='bold')
+    if detailed:
+        nx.draw_networkx_edges(G, pos, edgelist=G.edges(), arrows=True, arrowstyle='->', arrowsize=max(5, 20 * scale), connectionstyle='arc3,rad=0.1')
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=nx.get_edge_attributes(G, 'label'), font_color='black', font_size=11)
+        plt.title(spec["title"], size=16)
+    else:
+        # One patch per arrow is what makes big graphs slow; a single LineCollection is near-free.
+        nx.draw_networkx_edges(G, pos, edgelist=G.edges(), arrows=False, width=0.5, alpha=0.6)
+        plt.title(f"{spec['title']} ({n} states, edge labels and arrows omitted)", size=16)
+
+    drawn = time.perf_counter()
+    buf = io.BytesIO()
+    plt.savefig(buf, format=fmt, bbox_inches='tight')
+    plt.close('all')
+    timings = {"render_layout": laid_out - started, "render_draw": drawn - laid_out, "render_encode": time.perf_counter() - drawn}
+    return buf.getvalue(), layout, timings
+
+
+# ==============================================================================
+# TEXT OUTPUTS - DOT source and layout JSON need no matplotlib at all
+# ==============================================================================
+def _dot_id(name):
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def to_dot(spec):
+    finals = set(spec["finals"])
+    lines = ["digraph automaton {", "  rankdir=LR;", f"  label={_dot_id(spec['title'])};", "  node [shape=circle];"]
+    for node in spec["nodes"]:
+        if node in finals: lines.append(f"  {_dot_id(node)} [shape=doublecircle];")
+    if spec["initial"] in spec["nodes"]:
+        lines.append('  "__start" [shape=point];')
+        lines.append(f'  "__start" -> {_dot_id(spec["initial"])};')
+    for u, v, label in spec["edges"]:
+        lines.append(f"  {_dot_id(u)} -> {_dot_id(v)} [label={_dot_id(label)}];")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def to_layout_json(spec, layout):
+    finals = set(spec["finals"])
+    return {
+        "title": spec["title"], "engine": choose_engine(spec),
+        "nodes": [
+            {"id": node, "x": round(x, 4), "y": round(y, 4), "initial": node == spec["initial"], "final": node in finals}
+            for node, (x, y) in zip(spec["nodes"], layout)
+        ],
+        "edges": [{"from": u, "to": v, "label": label} for u, v, label in spec["edges"]],
+    }
+
+
+class RenderService:
+    def __init__(self, workers=RENDER_WORKERS, queue_depth=RENDER_QUEUE_DEPTH, timeout=RENDER_TIMEOUT):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.timeout = timeout
+        self._executor = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.image_cache = LRUCache(RENDER_CACHE_SIZE, maxcost=RENDER_CACHE_BYTES)
+        self.layout_cache = LRUCache(RENDER_CACHE_SIZE * 4, maxcost=RENDER_LAYOUT_CACHE_BYTES)
+        self.spec_cache = LRUCache(RENDER_CACHE_SIZE * 4, maxcost=RENDER_SPEC_CACHE_BYTES)
+
+    @property
+    def capacity(self):
+        return self.workers + self.queue_depth
+
+    def start(self):
+        if self._executor is not None: return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+        )
+        # The pool spawns lazily; one no-op per worker brings them all up (and through _init_worker) now.
+        for _ in range(self.workers):
+            self._executor.submit(int)
+
+    def shutdown(self, executor=None, kill=False):
+        # executor: only if it is still the current pool (an old pool's failure must not take down
+        # its replacement). kill: a pool cannot cancel a running task, so a wedged render is
+        # stopped by killing the workers; every future still pending on the pool then fails,
+        # which releases its slot, and the next request starts a fresh pool.
+        executor = executor or self._executor
+        if executor is None or executor is not self._executor: return
+        self._executor = None
+        if kill:
+            for process in list((executor._processes or {}).values()): process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "workers": self.workers, "queue_depth": self.queue_depth, "in_flight": self._in_flight, "timeout": self.timeout,
+            "image_cache": self.image_cache.stats(), "layout_cache": self.layout_cache.stats(), "spec_cache": self.spec_cache.stats(),
+        }
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise RenderBusy("Render queue is full, retry shortly.")
+            self._in_flight += 1
+        self.start()
+        executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self.shutdown(executor)
+            raise RenderError("Render worker pool crashed and was restarted.")
+
+        # The slot is held until the worker is really done, not just until we stop waiting on it.
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.shutdown(executor, kill=True)
+            raise RenderTimeout(f"Rendering took longer than {self.timeout:g}s; the render workers were restarted.")
+        except BrokenProcessPool:
+            self.shutdown(executor)
+            raise RenderError("Render worker pool crashed and was restarted.")
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    async def _layout(self, spec, structure_key):
+        layout = self.layout_cache.get(structure_key)
+        if layout is None:
+            with stage("render_layout"):
+                layout = await self._run(compute_layout, spec)
+            self.layout_cache.put(structure_key, layout, layout_bytes(layout))
+        return layout
+
+    async def artifact(self, spec, structure_key, image_key, fmt="png"):
+        # Raw output for one format: bytes for png, str for svg/dot, dict for layout.
+        if fmt == "dot":
+            return to_dot(spec)
+        if fmt == "layout":
+            return to_layout_json(spec, await self._layout(spec, structure_key))
+        data = self.image_cache.get((image_key, fmt))
+        if data is None:
+            # A renamed copy of a known automaton still skips the layout; only the drawing is redone.
+            with stage("render"):
+                data, layout, timings = await self._run(_render_figure, spec, self.layout_cache.get(structure_key), fmt)
+            for name, seconds in timings.items(): record_stage(name, seconds)
+            size = len(data)
+            gauge("image_bytes", size)
+            if layout is not None: self.layout_cache.put(structure_key, layout, layout_bytes(layout))
+            if fmt == "svg": data = data.decode('utf-8')
+            self.image_cache.put((image_key, fmt), data, size)
+        return data
+
+    async def artifact_by_key(self, image_key, fmt):
+        entry = self.spec_cache.get(image_key)
+        if entry is None:
+            raise RenderNotFound("Graph is no longer cached; request the automaton again.")
+        spec, structure_key = entry
+        return await self.artifact(spec, structure_key, image_key, fmt)
+
+    async def render(self, spec, fmt="png", inline=True):
+        with stage("canonicalize"):
+            spec, structure_key, image_key = canonicalize(spec)
+        # Remember the spec so the graph can also be fetched lazily from graph_url.
+        self.spec_cache.put(image_key, (spec, structure_key), spec_bytes(spec))
+        result = {"graph_format": fmt, "graph_url": f"/api/graph/{image_key}/{fmt}", "graph_image": None}
+        if inline:
+            data = await self.artifact(spec, structure_key, image_key, fmt)
+            with stage("base64"):
+                result["graph_image"] = "data:image/png;base64," + base64.b64encode(data).decode('utf-8') if fmt == "png" else data
+        return result
+
+
+render_service = RenderService()
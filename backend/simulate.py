@@ -0,0 +1,139 @@
+import codecs
+import json
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+# ==============================================================================
+# BATCH MEMBERSHIP - dense int32 transition table, all strings advanced in lock-step
+# ==============================================================================
+# Once fewer than SCALAR_CUTOFF strings are still running (the long tail of a batch, or a
+# single long input) per-step NumPy overhead outweighs the gather, so those finish scalar.
+# NumPy is imported where it is used, so a process that never runs a batch never loads it.
+SCALAR_CUTOFF = 16
+STREAM_CHUNK_BYTES = 1 << 20
+
+
+class CompiledDFA:
+    def __init__(self, names, symbols, table, finals):
+        import numpy as np
+        # names/table/finals as produced by minimize.dfa_from_json: start state first,
+        # and a None name for an implicit sink.
+        if any(len(sym) != 1 for sym in symbols):
+            raise ValueError("Batch runs need single-character alphabet symbols.")
+        n, k = len(names), len(symbols)
+        self.names = names
+        self.symbols = symbols
+        self.dead = n
+        # One extra row for a dead state and one extra column for symbols outside the alphabet.
+        self.table = np.full((n + 1, k + 1), n, dtype=np.int32)
+        if n and k: self.table[:n, :k] = np.asarray(table, dtype=np.int32).reshape(n, k)
+        self.accepting = np.zeros(n + 1, dtype=bool)
+        self.accepting[:n] = finals
+        codepoints = [ord(sym) for sym in symbols]
+        self.column = np.full(max(codepoints, default=0) + 2, k, dtype=np.int32)
+        self.column[codepoints] = np.arange(k, dtype=np.int32)
+
+    def encode(self, text):
+        import numpy as np
+        points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        return self.column[np.minimum(points, len(self.column) - 1)]
+
+    def run(self, strings, start=None):
+        # Returns the final state id of every string (self.dead if it fell off the DFA).
+        # start optionally gives each string's starting state instead of the initial one.
+        import numpy as np
+        m = len(strings)
+        lengths = np.fromiter(map(len, strings), dtype=np.int64, count=m)
+        columns = self.encode("".join(strings))
+        starts = np.zeros(m, dtype=np.int64)
+        if m > 1: np.cumsum(lengths[:-1], out=starts[1:])
+
+        # Longest first, so the strings still running at step t are always a prefix.
+        order = np.argsort(-lengths, kind='stable')
+        lengths, starts = lengths[order], starts[order]
+        state = np.zeros(m, dtype=np.int32) if start is None else np.asarray(start, dtype=np.int32)[order]
+        table = self.table
+        max_len = int(lengths[0]) if m else 0
+        active = np.searchsorted(-lengths, -np.arange(max_len), side='left')
+
+        t = 0
+        while t < max_len and active[t] > SCALAR_CUTOFF:
+            a = active[t]
+            state[:a] = table[state[:a], columns[starts[:a] + t]]
+            t += 1
+        if t < max_len:
+            rows = table.tolist()
+            for i in range(int(active[t])):
+                s = int(state[i])
+                for c in columns[starts[i] + t:starts[i] + lengths[i]].tolist():
+                    s = rows[s][c]
+                state[i] = s
+
+        result = np.empty(m, dtype=np.int32)
+        result[order] = state
+        return result
+
+    def run_batch(self, strings, return_states=False):
+        started = time.perf_counter()
+        final = self.run(strings)
+        elapsed = time.perf_counter() - started
+        symbols = sum(map(len, strings))
+        out = {
+            "accepted": self.accepting[final].tolist(),
+            "stats": {
+                "strings": len(strings), "symbols": symbols, "time_ms": round(elapsed * 1000, 3),
+                "symbols_per_second": round(symbols / elapsed) if elapsed > 0 else None,
+            },
+        }
+        if return_states:
+            names = self.names + [None]
+            out["final_states"] = [names[s] for s in final.tolist()]
+        return out
+
+
+# ==============================================================================
+# STREAMING MEMBERSHIP - newline-delimited upload in, NDJSON results out
+# ==============================================================================
+# The file is read chunk by chunk. A line cut by a chunk boundary is not buffered:
+# only the DFA state reached so far is carried into the next chunk, so memory stays
+# at one chunk however long the lines are.
+async def stream_membership(compiled, upload, return_states=False, chunk_size=STREAM_CHUNK_BYTES):
+    started = time.perf_counter()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    names = compiled.names + [None]
+    carry, carry_used = 0, False
+    line_no = accepted = symbols = 0
+
+    def emit(final):
+        nonlocal line_no, accepted
+        out = []
+        for s in final:
+            line_no += 1
+            ok = bool(compiled.accepting[s])
+            accepted += ok
+            record = {"line": line_no, "accepted": ok}
+            if return_states: record["state"] = names[s]
+            out.append(json.dumps(record))
+        return ("\n".join(out) + "\n").encode() if out else b""
+
+    while True:
+        chunk = await upload.read(chunk_size)
+        # CRs are dropped outright so a CRLF split across two chunks cannot leak into a line.
+        text = decoder.decode(chunk, final=not chunk).replace("\r", "")
+        if text:
+            pieces = text.split("\n")
+            symbols += len(text) - len(pieces) + 1
+            start = [carry] + [0] * (len(pieces) - 1)
+            final = (await run_in_threadpool(compiled.run, pieces, start)).tolist()
+            # The last piece has no newline yet; it continues in the next chunk.
+            carry, carry_used = final[-1], bool(pieces[-1]) or (carry_used and len(pieces) == 1)
+            block = emit(final[:-1])
+            if block: yield block
+        if not chunk:
+            break
+
+    if carry_used:
+        yield emit([carry])
+    summary = {"lines": line_no, "accepted": accepted, "symbols": symbols, "time_ms": round((time.perf_counter() - started) * 1000, 3)}
+    yield (json.dumps({"summary": summary}) + "\n").encode()
@@ -0,0 +1,85 @@
+import json
+import time
+
+from admission import CONSTRUCTION_TIMEOUT, MAX_DFA_STATES, admit_nfa
+from artifacts import artifact_key
+from determinize import LimitExceeded, subset_states
+from grammar import GrammarProcessor
+from lr import LR0Automaton, automaton_analysis, lr_tables, table_response
+
+# ==============================================================================
+# PROGRESSIVE CONSTRUCTION - Server-Sent Events as the BFS discovers states
+# ==============================================================================
+# Every DFA state / LR item set is sent as soon as the BFS expands it, then a final
+# 'done' (or 'error') event. The first event is flushed at once and later ones are
+# batched up to SSE_FLUSH_SECONDS apart, so a huge construction is not one write per
+# state. The generators are sync: StreamingResponse pulls them through the threadpool
+# and stops pulling when the client disconnects, so a cancelled construction ends at
+# the next flush instead of running to completion.
+SSE_FLUSH_SECONDS = 0.05
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def batched(events):
+    buffer, flushed = [], 0.0
+    for text in events:
+        buffer.append(text)
+        now = time.perf_counter()
+        if now - flushed >= SSE_FLUSH_SECONDS:
+            yield "".join(buffer)
+            buffer, flushed = [], now
+    if buffer: yield "".join(buffer)
+
+
+# The *_events functions do their validation eagerly, so a bad request still gets a plain
+# 4xx response; only the returned generator runs the construction.
+def dfa_events(nfa_def):
+    states = subset_states(admit_nfa(nfa_def), MAX_DFA_STATES, CONSTRUCTION_TIMEOUT)
+    return batched(_dfa_events(next(states), states))
+
+
+def _dfa_events(dfa, states):
+    yield sse("start", {"nfa_states": len(dfa.nfa_names), "alphabet": dfa.symbols})
+    try:
+        for i in states:
+            mask = dfa.masks[i]
+            yield sse("state", {"id": i, "label": dfa.label(mask), "final": bool(mask & dfa.finals_mask), "transitions": dfa.table[i]})
+    except LimitExceeded as e:
+        yield sse("error", dict(e.detail(), status=e.status_code))
+        return
+    yield sse("done", {"states": len(dfa.masks), "start_state": dfa.label(dfa.masks[0]), "stats": dfa.stats})
+
+
+def lr_events(grammar, kind):
+    automaton = LR0Automaton(GrammarProcessor(grammar, is_slr=True), build=False)
+    return batched(_lr_events(grammar, kind, automaton))
+
+
+def _lr_events(grammar, kind, automaton):
+    processor = automaton.processor
+    yield sse("start", {
+        "productions": [f"{h} -> {' '.join(b) if b else 'epsilon'}" for h, b in automaton.productions[1:]],
+        "terminals": sorted(processor.terminals | {'$'}), "non_terminals": sorted(processor.non_terminals - {processor.start_symbol}),
+    })
+    for i in automaton.discover():
+        yield sse("item_set", {"id": i, "name": f"I{i}", "items": automaton.format_items(i), "transitions": automaton.transitions[i]})
+
+    # The finished tables go into the artifact cache, so the table_id works with /api/lr/parse.
+    try:
+        analysis = automaton_analysis(automaton, kind)
+    except ValueError as e:
+        analysis = {"error": str(e)}
+    table_id = artifact_key(kind, grammar)
+    lr_tables.remember(table_id, kind, analysis)
+    if "error" in analysis:
+        yield sse("error", {"error": analysis["error"], "status": 400})
+        return
+    result = table_response(analysis)
+    del result["item_sets"]  # already streamed
+    if kind == "lalr": result["conflicts"] = analysis["conflicts"]
+    result["table_id"] = table_id
+    yield sse("done", result)
@@ -0,0 +1,97 @@
+# ==============================================================================
+# COMPACT PARSE TABLES - interned symbols, default rows, comb-vector packing
+# ==============================================================================
+# Wire format for encoding=compact. Symbols are ids: terminals 0..T-1 then
+# non-terminals T..; productions are [lhs id, [rhs ids]]. A packed table answers
+# cell (r, c) as value[base[r] + c] when check[base[r] + c] == r, and default[r]
+# otherwise; base[r] + c may point past the end of check, which also means the
+# default. Bases are never negative. Rows are placed largest first at the lowest
+# base where all their cells land on free slots, so sparse rows interleave into one
+# short vector.
+def comb_pack(rows, default):
+    order = sorted(range(len(rows)), key=lambda r: -len(rows[r]))
+    base = [0] * len(rows)
+    value, check = [], []
+    first_free = 0
+    for r in order:
+        cols = sorted(rows[r])
+        if not cols: continue
+        b = max(0, first_free - cols[0])
+        while any(b + c < len(check) and check[b + c] != -1 for c in cols):
+            b += 1
+        end = b + cols[-1] + 1
+        if end > len(check):
+            value.extend([0] * (end - len(check)))
+            check.extend([-1] * (end - len(check)))
+        for c in cols:
+            value[b + c] = rows[r][c]
+            check[b + c] = r
+        base[r] = b
+        while first_free < len(check) and check[first_free] != -1:
+            first_free += 1
+    return {"default": default, "base": base, "value": value, "check": check}
+
+
+def _most_common(values):
+    counts = {}
+    for v in values: counts[v] = counts.get(v, 0) + 1
+    return max(counts, key=lambda v: (counts[v], -v)) if counts else None
+
+
+def _packed_size(table):
+    return len(table["default"]) + len(table["base"]) + 2 * len(table["value"])
+
+
+# LR action codes are CompiledLR's: 0 error, s + 1 shift, -1 accept, -(n + 2) reduce by
+# production n. A state's most frequent reduction becomes its default row entry (yacc's
+# default reductions: an error may be detected a few reductions later, never missed).
+# Goto is packed by non-terminal column with the most frequent target as the default.
+def compact_lr(compiled):
+    terminals, non_terminals = compiled.terminals, compiled.non_terminals
+    n_states = len(compiled.action)
+    action_rows, action_default = [], []
+    for row in compiled.action:
+        reduce = _most_common([code for code in row if code < -1])
+        default = reduce if reduce is not None else 0
+        action_default.append(default)
+        action_rows.append({t: code for t, code in enumerate(row) if code and code != default})
+
+    goto_rows, goto_default = [], []
+    for nt in range(len(non_terminals)):
+        targets = {s: compiled.goto[s][nt] for s in range(n_states) if compiled.goto[s][nt] >= 0}
+        default = _most_common(list(targets.values()))
+        goto_default.append(default if default is not None else -1)
+        goto_rows.append({s: t for s, t in targets.items() if t != default})
+
+    action = comb_pack(action_rows, action_default)
+    goto = comb_pack(goto_rows, goto_default)
+    return {
+        "encoding": "compact",
+        "terminals": terminals, "non_terminals": non_terminals,
+        "productions": [[compiled.lhs[p] + len(terminals), list(compiled.rhs[p])] for p in range(1, len(compiled.rhs))],
+        "action": action, "goto": goto,
+        "stats": {
+            "states": n_states, "dense_cells": n_states * (len(terminals) + len(non_terminals)),
+            "packed_cells": _packed_size(action) + _packed_size(goto),
+        },
+    }
+
+
+# LL(1) rows are indexed by non-terminal, columns by terminal; -1 is an error. Each row
+# defaults to its most frequent production, which at worst defers the error to the next
+# terminal match at the same input position.
+def compact_ll1(compiled):
+    terminals, non_terminals = compiled.terminals, compiled.non_terminals
+    rows, default = [], []
+    for row in compiled.rows:
+        common = _most_common([pid for pid in row if pid >= 0])
+        default.append(common if common is not None else -1)
+        rows.append({t: pid for t, pid in enumerate(row) if pid >= 0 and pid != common})
+    table = comb_pack(rows, default)
+    return {
+        "encoding": "compact",
+        "terminals": terminals, "non_terminals": non_terminals,
+        "productions": [[compiled.lhs[p], list(reversed(body))] for p, body in enumerate(compiled.rbodies)],
+        "table": table,
+        "stats": {"dense_cells": len(non_terminals) * len(terminals), "packed_cells": _packed_size(table)},
+    }
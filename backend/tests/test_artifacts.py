@@ -0,0 +1,63 @@
+import sqlite3
+
+import artifacts
+from artifacts import ArtifactStore, artifact_key
+
+
+def rows(path):
+    with sqlite3.connect(path) as conn:
+        return [key for key, in conn.execute("SELECT key FROM artifacts ORDER BY created")]
+
+
+def test_key_includes_version(monkeypatch):
+    key = artifact_key("ll1", "S -> a")
+    assert artifact_key("ll1", "S  ->  a") == key
+    monkeypatch.setattr(artifacts, "ARTIFACT_VERSION", artifacts.ARTIFACT_VERSION + 1)
+    assert artifact_key("ll1", "S -> a") != key
+
+
+def test_round_trip_through_disk(tmp_path):
+    path = str(tmp_path / "a.sqlite3")
+    ArtifactStore(path).put("k", "ll1", {"table": [1, 2]})
+    store = ArtifactStore(path)
+    assert store.get("k") == {"table": [1, 2]}
+    assert store.disk_hits == 1
+
+
+def test_errors_are_not_persisted(tmp_path):
+    path = str(tmp_path / "a.sqlite3")
+    store = ArtifactStore(path)
+    store.put("ok", "ll1", {"table": []})
+    store.put("bad", "ll1", {"error": "not LL(1)"})
+    assert store.get("bad") == {"error": "not LL(1)"}
+    assert rows(path) == ["ok"]
+
+
+def test_evicts_oldest_by_rows_and_bytes(tmp_path):
+    path = str(tmp_path / "a.sqlite3")
+    store = ArtifactStore(path, max_rows=3)
+    for i in range(5): store.put(f"k{i}", "ll1", {"i": i})
+    assert rows(path) == ["k2", "k3", "k4"]
+    store = ArtifactStore(str(tmp_path / "b.sqlite3"), max_bytes=250)
+    for i in range(5): store.put(f"k{i}", "ll1", {"pad": "x" * 100})
+    assert rows(str(tmp_path / "b.sqlite3")) == ["k3", "k4"]
+    assert store.disk_evictions == 3
+
+
+def test_disk_errors_back_off_and_recover(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path / "a.sqlite3"))
+    real_db = store._db
+
+    def broken():
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(store, "_db", broken)
+    store.put("k", "ll1", {"v": 1})
+    assert store.disk_errors == 1 and store.stats()["disk_backoff_s"] > 0
+    # While backing off the disk is not touched at all.
+    store.put("k2", "ll1", {"v": 2})
+    assert store.disk_errors == 1
+
+    monkeypatch.setattr(store, "_db", real_db)
+    store._retry_at = 0
+    store.put("k3", "ll1", {"v": 3})
+    assert store.path is not None and rows(store.path) == ["k3"]
@@ -0,0 +1,39 @@
+import threading
+
+import derivatives
+from cache import LRUCache
+from derivatives import cached_regex_to_dfa
+
+
+def test_evicts_by_count_and_cost():
+    cache = LRUCache(maxsize=3, maxcost=10)
+    for k in "abc": cache.put(k, k, 2)
+    cache.get("a")
+    cache.put("d", "d", 2)
+    assert "b" not in cache and len(cache) == 3
+    cache.put("e", "e", 7)
+    assert list(cache._data) == ["d", "e"] and cache.total_cost == 9
+
+
+def test_concurrent_use_keeps_invariants():
+    cache = LRUCache(maxsize=50, maxcost=400)
+
+    def hammer(seed):
+        for i in range(5000):
+            key = (seed * 7 + i) % 120
+            if cache.get(key) is None: cache.put(key, i, 1 + key % 16)
+            if i % 50 == 0: cache.set_cost(key, 3)
+    threads = [threading.Thread(target=hammer, args=(n,)) for n in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(cache) <= 50 and cache.total_cost <= 400
+    assert cache.total_cost == sum(cache._costs.values()) and set(cache._costs) == set(cache._data)
+
+
+def test_derivative_cache_is_bounded_by_cost(monkeypatch):
+    bounded = LRUCache(maxsize=100, maxcost=1)
+    monkeypatch.setattr(derivatives, "derivative_dfas", bounded)
+    cached_regex_to_dfa("(a|b)*abb")
+    cached_regex_to_dfa("a*b*")
+    stats = bounded.stats()
+    assert stats["size"] == 1 and stats["evictions"] == 1 and stats["cost"] > 0
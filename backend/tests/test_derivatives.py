@@ -0,0 +1,43 @@
+import itertools
+
+import pytest
+from automata.fa.nfa import NFA
+
+from derivatives import regex_to_dfa
+
+ALPHABET = set("ab01_ \n\t")
+
+
+def accepts(dfa, text):
+    column = {sym: c for c, sym in enumerate(dfa.symbols)}
+    rows, state = dfa.rows(), dfa.start
+    for ch in text:
+        if ch not in column: return False
+        state = rows[state][column[ch]]
+        if state is None: return False
+    return bool(dfa.finals >> state & 1)
+
+
+def strings(alphabet, max_len):
+    for n in range(max_len + 1):
+        for chars in itertools.product(sorted(alphabet), repeat=n):
+            yield ''.join(chars)
+
+
+@pytest.mark.parametrize("regex", [
+    r"\d+", r"\D", r"\w\w", r"\W", r"\s", r"\S+", r"a\nb", r"a\tb", r"[\d-]+", r"[-a]b", r"[\w ]*", r"[^\s]",
+    r"(a|\d)*b", r"\d?\s\w", r"a\.b|\\",
+])
+def test_matches_automata_lib(regex):
+    dfa = regex_to_dfa(regex, alphabet=ALPHABET)
+    nfa = NFA.from_regex(regex, input_symbols=ALPHABET)
+    for text in strings(ALPHABET, 3):
+        assert accepts(dfa, text) == nfa.accepts_input(text), (regex, text)
+
+
+def test_escapes_without_alphabet():
+    dfa = regex_to_dfa(r"\d+")
+    assert accepts(dfa, "12") and not accepts(dfa, "dd")
+    dfa = regex_to_dfa(r"a\nb")
+    assert accepts(dfa, "a\nb") and not accepts(dfa, "anb")
+    assert accepts(regex_to_dfa(r"\w"), "a")
@@ -0,0 +1,57 @@
+import itertools
+import random
+
+from automata.fa.dfa import DFA
+from automata.fa.nfa import NFA
+
+from determinize import determinize
+from lazydfa import LazyDFA
+from simulate import CompiledDFA
+
+SYMBOLS = ["a", "b"]
+STRINGS = [''.join(w) for n in range(7) for w in itertools.product("abc", repeat=n)]
+
+
+def random_nfa(rng):
+    n = rng.randint(1, 7)
+    states = [f"p{i}" for i in range(n)]
+    transitions = {}
+    for s in states:
+        trans = {}
+        for sym in SYMBOLS + ['']:
+            targets = [t for t in states if rng.random() < (0.15 if sym == '' else 0.3)]
+            if targets: trans[sym] = targets
+        transitions[s] = trans
+    finals = [s for s in states if rng.random() < 0.3]
+    return {"states": states, "alphabet": SYMBOLS, "transitions": transitions, "start_state": states[0], "final_states": finals}
+
+
+def automata_lib_nfa(nfa_def):
+    return NFA(states=set(nfa_def["states"]), input_symbols=set(SYMBOLS),
+               transitions={s: {sym: set(ts) for sym, ts in trans.items()} for s, trans in nfa_def["transitions"].items()},
+               initial_state=nfa_def["start_state"], final_states=set(nfa_def["final_states"]))
+
+
+def test_subset_construction_matches_automata_lib():
+    rng = random.Random(3)
+    for _ in range(200):
+        nfa_def = random_nfa(rng)
+        reference = automata_lib_nfa(nfa_def)
+        dfa = determinize(nfa_def)
+        accepted = CompiledDFA(*dfa.dense()).run_batch(STRINGS)["accepted"]
+        assert accepted == ['c' not in w and reference.accepts_input(w) for w in STRINGS], nfa_def
+        # Same reachable subsets; automata-lib leaves the empty one implicit.
+        expected = DFA.from_nfa(reference, retain_names=True, minify=False).states
+        subsets = {frozenset(dfa.nfa_names[i] for i in range(len(dfa.nfa_names)) if m >> i & 1) for m in dfa.masks}
+        assert subsets - {frozenset()} == set(expected)
+
+
+def test_lazy_dfa_matches_subset_construction():
+    rng = random.Random(9)
+    for _ in range(100):
+        nfa_def = random_nfa(rng)
+        expected = CompiledDFA(*determinize(nfa_def).dense()).run_batch(STRINGS)["accepted"]
+        # A two-state cache forces flushes and the NFA fallback.
+        for max_states in (2, 64):
+            lazy = LazyDFA(nfa_def, max_states)
+            assert [lazy.match(w) for w in STRINGS] == expected
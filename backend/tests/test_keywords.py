@@ -0,0 +1,105 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+import keywords
+from determinize import LimitExceeded
+from keywords import KeywordAutomaton, stream_scan
+from simulate import CompiledDFA
+
+
+def naive(keywords, text):
+    return sorted((i, i + len(k), n) for n, k in enumerate(keywords) for i in range(len(text)) if text.startswith(k, i))
+
+
+def random_keywords(rng):
+    return list(dict.fromkeys(''.join(rng.choice("ab") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))))
+
+
+def test_scan_matches_naive_search():
+    rng = random.Random(2)
+    for _ in range(300):
+        keywords = random_keywords(rng)
+        automaton = KeywordAutomaton(keywords)
+        text = ''.join(rng.choice("abc") for _ in range(rng.randint(0, 40)))
+        matches, count, _ = automaton.scan(text)
+        assert sorted(matches) == naive(keywords, text) and count == len(matches)
+
+        # Split anywhere, carrying only the state across: same matches, same offsets.
+        cut = rng.randint(0, len(text))
+        head, _, state = automaton.scan(text[:cut])
+        tail, _, _ = automaton.scan(text[cut:], state, cut)
+        assert sorted(head + tail) == sorted(matches)
+
+
+def test_keyword_dfas_match_naive_membership():
+    rng = random.Random(4)
+    for _ in range(100):
+        keywords = random_keywords(rng)
+        automaton = KeywordAutomaton(keywords, alphabet="abc")
+        texts = [''.join(rng.choice("abc") for _ in range(rng.randint(0, 8))) for _ in range(50)]
+        exact = CompiledDFA(*automaton.dfa("exact").dense()).run_batch(texts)["accepted"]
+        search = CompiledDFA(*automaton.dfa("search").dense()).run_batch(texts)["accepted"]
+        assert exact == [t in keywords for t in texts]
+        assert search == [any(t.endswith(k) for k in keywords) for t in texts]
+
+
+def test_flattened_dfa_leaves_root_edges_implied():
+    automaton = KeywordAutomaton(["he", "she", "his", "hers"], alphabet="ehirsx")
+    dfa = automaton.dfa("search")
+    assert dfa.default == 0 and len(dfa.targets) == automaton.stats["flat_edges"] < len(dfa) * len(dfa.symbols)
+    # Serialized, every state has every edge again.
+    assert len(dfa.to_json()["transitions"]) == len(dfa) * len(dfa.symbols)
+    assert dfa.to_json()["transitions"]["q0,x"] == "q0"
+
+
+def test_flattening_is_refused_above_the_cell_limit(monkeypatch):
+    monkeypatch.setattr(keywords, "KEYWORD_DFA_MAX_CELLS", 10)
+    automaton = KeywordAutomaton(["abc", "bcd"])
+    with pytest.raises(LimitExceeded):
+        automaton.dfa("search")
+    assert len(automaton.dfa("exact")) == 7 and len(automaton.dfa("search", flatten=False)) == 7
+
+
+def test_endpoints_build_off_the_event_loop(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    loops = []
+
+    def build(words, alphabet=None):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return KeywordAutomaton(words, alphabet)
+    monkeypatch.setattr(main, "cached_keywords", build)
+    client = TestClient(main.app)
+    assert client.post("/api/generate-dfa/keywords", json={"keywords": ["he", "she"], "format": "dot"}).status_code == 200
+    assert client.post("/api/keywords/scan", json={"keywords": ["he"], "texts": ["the"]}).status_code == 200
+    assert client.post("/api/keywords/scan-stream", files={"file": ("t.txt", b"the")}, data={"keywords": '["he"]'}).status_code == 200
+    assert loops == [None, None, None]
+
+
+def test_stream_scan_reads_byte_chunks_and_reports_character_offsets():
+    text = "ünïcödé héllo wörld " * 5
+    data = text.encode()
+
+    class Upload:
+        position = 0
+
+        async def read(self, size):
+            chunk = data[self.position:self.position + size]
+            self.position += len(chunk)
+            return chunk
+
+    async def collect():
+        return [json.loads(line) async for chunk in stream_scan(automaton, Upload(), chunk_size=3)
+                for line in chunk.decode().splitlines()]
+    automaton = KeywordAutomaton(["ö", "héllo", "d é"])
+    records = asyncio.run(collect())
+    assert records[-1]["summary"]["symbols"] == len(text)
+    expected = naive(automaton.keywords, text)
+    assert [(r["start"], r["end"], r["keyword"]) for r in records[:-1]] == [(s, e, automaton.keywords[k]) for s, e, k in expected]
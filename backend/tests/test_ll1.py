@@ -0,0 +1,50 @@
+import itertools
+
+import pytest
+
+from ll1 import CompiledLL1, ll1_analysis
+
+GRAMMARS = [
+    "E -> T E'\nE' -> + T E' | epsilon\nT -> F T'\nT' -> * F T' | epsilon\nF -> ( E ) | id",
+    "S -> a S b | epsilon",
+    "S -> A B\nA -> a A | epsilon\nB -> b | c",
+]
+
+
+def reference_parse(analysis, tokens):
+    # Textbook predictive parser straight off the analysis table, symbols as strings.
+    table, productions = analysis["table"], analysis["productions"]
+    tokens, stack, pos, derivation = list(tokens) + [None], ['$', analysis["start"]], 0, []
+    while True:
+        top, tok = stack.pop(), tokens[pos]
+        if top == '$': return tok is None, derivation
+        if top not in table:
+            if top != tok: return False, derivation
+            pos += 1
+            continue
+        # A literal "$" token is just an unknown token; only the real end of input is '$'.
+        pid = table[top].get('$') if tok is None else None if tok == '$' else table[top].get(tok)
+        if pid is None: return False, derivation
+        stack.extend(reversed(productions[pid][1]))
+        derivation.append(pid)
+
+
+@pytest.mark.parametrize("grammar", GRAMMARS)
+def test_runtime_agrees_with_table(grammar):
+    analysis = ll1_analysis(grammar)
+    compiled = CompiledLL1(analysis)
+    symbols = analysis["terminals"] + ["junk"]
+    for n in range(6):
+        for tokens in itertools.product(symbols, repeat=n):
+            accepted, derivation = reference_parse(analysis, tokens)
+            out = compiled.parse(list(tokens), derivation=True)
+            assert out["accepted"] == accepted, tokens
+            if accepted: assert out["derivation"] == derivation, tokens
+
+
+def test_dollar_token_is_not_end_of_input():
+    compiled = CompiledLL1(ll1_analysis("S -> a"))
+    assert compiled.parse(["a"])["accepted"]
+    out = compiled.parse(["a", "$", "junk"])
+    assert not out["accepted"] and out["error"]["position"] == 1 and out["error"]["token"] == "$"
+    assert not compiled.parse(["$"])["accepted"]
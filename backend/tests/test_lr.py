@@ -0,0 +1,46 @@
+import itertools
+
+import pytest
+
+from lr import CompiledLR, lr_analysis
+
+EXPR = "E -> E + T | T\nT -> T * F | F\nF -> ( E ) | id"
+NESTED = "S -> a S b | epsilon"
+ASSIGN = "S -> L = R | R\nL -> * R | id\nR -> L"  # LALR(1) but not SLR(1)
+
+
+def reference_parse(analysis, tokens):
+    # Shift-reduce loop straight off the action/goto tables, symbols as strings.
+    action, goto, productions = analysis["action"], analysis["goto"], analysis["productions"]
+    tokens, stack, pos = list(tokens), [0], 0
+    while True:
+        # A literal "$" token is just an unknown token; only the real end of input is '$'.
+        tok = '$' if pos == len(tokens) else None if tokens[pos] == '$' else tokens[pos]
+        act = action.get(str(stack[-1]), {}).get(tok)
+        if act is None: return False
+        if act == "Accept": return True
+        if act[0] == 'S':
+            stack.append(int(act[1:]))
+            pos += 1
+            continue
+        head, body = productions[int(act[1:]) + 1]
+        if body: del stack[-len(body):]
+        stack.append(goto[str(stack[-1])][head])
+
+
+@pytest.mark.parametrize("grammar, kind", [(EXPR, "slr"), (EXPR, "lalr"), (NESTED, "slr"), (NESTED, "lalr"), (ASSIGN, "lalr")])
+def test_runtime_agrees_with_table(grammar, kind):
+    analysis = lr_analysis(grammar, kind)
+    assert not analysis["conflicts"]
+    compiled = CompiledLR(analysis)
+    symbols = analysis["terminals"] + ["$", "junk"]
+    for n in range(6):
+        for tokens in itertools.product(symbols, repeat=n):
+            assert compiled.parse(list(tokens))["accepted"] == reference_parse(analysis, tokens), tokens
+
+
+def test_dollar_token_is_not_end_of_input():
+    compiled = CompiledLR(lr_analysis("S -> a"))
+    assert compiled.parse(["a"])["accepted"]
+    assert not compiled.parse(["a", "$", "junk"])["accepted"]
+    assert not compiled.parse_traced(["a", "$", "junk"])["accepted"]
@@ -0,0 +1,54 @@
+import itertools
+import random
+
+from minimize import hopcroft, minimize_table
+from simulate import CompiledDFA
+
+
+def random_dfa(rng, n, k):
+    return [[rng.randrange(n) for _ in range(k)] for _ in range(n)], [rng.random() < 0.4 for _ in range(n)]
+
+
+def brute_force_classes(table, finals, start=0):
+    # Table filling: two reachable states are distinguishable if one accepts and the other
+    # does not, or some symbol takes them to a distinguishable pair. Repeat to a fixed point.
+    live, stack = {start}, [start]
+    while stack:
+        for t in table[stack.pop()]:
+            if t not in live:
+                live.add(t)
+                stack.append(t)
+    live = sorted(live)
+    apart = {(p, q) for p in live for q in live if finals[p] != finals[q]}
+    changed = True
+    while changed:
+        changed = False
+        for p, q in itertools.product(live, repeat=2):
+            if (p, q) not in apart and any((a, b) in apart for a, b in zip(table[p], table[q])):
+                apart.add((p, q))
+                changed = True
+    return live, apart
+
+
+def test_hopcroft_matches_brute_force():
+    rng = random.Random(11)
+    for _ in range(300):
+        n, k = rng.randint(1, 9), rng.randint(1, 3)
+        table, finals = random_dfa(rng, n, k)
+        class_of, count = hopcroft(table, finals)
+        live, apart = brute_force_classes(table, finals)
+        assert [s for s in range(n) if class_of[s] is not None] == live
+        for p, q in itertools.product(live, repeat=2):
+            assert (class_of[p] == class_of[q]) == ((p, q) not in apart), (table, finals, p, q)
+        assert count == len({class_of[s] for s in live})
+
+
+def test_minimized_dfa_accepts_the_same_language():
+    rng = random.Random(5)
+    strings = [''.join(w) for n in range(7) for w in itertools.product("ab", repeat=n)]
+    for _ in range(100):
+        table, finals = random_dfa(rng, rng.randint(1, 12), 2)
+        names = [f"s{i}" for i in range(len(table))]
+        original = CompiledDFA(names, ["a", "b"], table, finals).run_batch(strings)["accepted"]
+        minimized = minimize_table(names, ["a", "b"], table, finals)
+        assert CompiledDFA(*minimized.dense()).run_batch(strings)["accepted"] == original
@@ -0,0 +1,18 @@
+from regex_cache import RegexCache
+
+
+def test_lazy_match_re_costs_the_entry():
+    cache = RegexCache()
+    before = cache.entries.stats()["cost"]
+    cache.lazy("(a|b)*a(a|b)(a|b)(a|b)")
+    lazy_built = cache.entries.stats()["cost"]
+    result = cache.match("(a|b)*a(a|b)(a|b)(a|b)", ["abab" * 20 + "b", "bbbb", "aaaa"])
+    assert result["accepted"] == [False, False, True]
+    key, entry = cache.get("(a|b)*a(a|b)(a|b)(a|b)")
+    assert before < lazy_built < cache.entries.stats()["cost"] == entry.cost()
+
+
+def test_match_search_mode():
+    cache = RegexCache()
+    result = cache.match("ab+", ["xxabbby", "ba"], mode="search")
+    assert result["matched"] == [True, False] and result["spans"] == [[2, 4], None]
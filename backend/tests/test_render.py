@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from layout import compute_layout
+from render import RenderService, RenderTimeout
+
+
+def test_image_cache_is_bounded_by_bytes():
+    service = RenderService()
+    service.image_cache.maxcost = 2500
+
+    async def fake_run(fn, spec, layout, fmt):
+        return b"x" * 1000, None, {}
+    service._run = fake_run
+
+    async def draw_all():
+        for key in ("a", "b", "c", "d"):
+            await service.artifact({}, ("structure", key), key, "png")
+    asyncio.run(draw_all())
+    stats = service.image_cache.stats()
+    assert stats["size"] == 2 and stats["cost"] == 2000 and stats["evictions"] == 2
+    assert service.image_cache.get(("d", "png")) == b"x" * 1000
+
+
+def test_spec_and_layout_caches_are_bounded_by_size():
+    service = RenderService()
+    service.spec_cache.maxcost = 50_000
+    service.layout_cache.maxcost = 50_000
+
+    async def fake_run(fn, spec, *args):
+        layout = [(0.0, 0.0)] * len(spec["nodes"])
+        return layout if fn is compute_layout else (b"png", layout, {})
+    service._run = fake_run
+
+    def spec(n, title):
+        nodes = [f"q{i}" for i in range(n)]
+        return {"title": title, "nodes": nodes, "edges": [(u, u, "a") for u in nodes], "initial": "q0", "finals": []}
+
+    async def draw_all():
+        for k in range(4):
+            await service.render(spec(100 + k, f"small {k}"), "png")
+        await service.render(spec(300, "big"), "layout")
+    asyncio.run(draw_all())
+    for cache in (service.spec_cache, service.layout_cache):
+        stats = cache.stats()
+        assert stats["cost"] <= 50_000 and stats["evictions"] > 0 and stats["size"] < 5
+
+
+def test_timed_out_render_frees_its_capacity():
+    service = RenderService(workers=1, queue_depth=0, timeout=1)
+
+    async def scenario():
+        with pytest.raises(RenderTimeout):
+            await service._run(time.sleep, 60)
+        # The wedged worker was killed, so its slot comes back without waiting for the sleep.
+        for _ in range(100):
+            if service._in_flight == 0: break
+            await asyncio.sleep(0.05)
+        assert service._in_flight == 0
+        service.timeout = 30  # room for the fresh pool to start
+        assert await service._run(abs, -3) == 3
+    try:
+        asyncio.run(scenario())
+    finally:
+        service.shutdown()
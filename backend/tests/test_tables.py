@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from ll1 import CompiledLL1, ll1_analysis
+from lr import CompiledLR, lr_analysis
+from tables import comb_pack, compact_ll1, compact_lr
+
+
+def decode(table, r, c):
+    # What a client does with the wire format.
+    i = table["base"][r] + c
+    return table["value"][i] if i < len(table["check"]) and table["check"][i] == r else table["default"][r]
+
+
+def test_comb_pack_round_trip():
+    rng = random.Random(7)
+    for _ in range(200):
+        width = rng.randint(1, 12)
+        rows = [{c: rng.randint(1, 9) for c in range(width) if rng.random() < rng.random()} for _ in range(rng.randint(1, 10))]
+        table = comb_pack(rows, [0] * len(rows))
+        assert min(table["base"]) >= 0
+        for r, row in enumerate(rows):
+            for c in range(width):
+                assert decode(table, r, c) == row.get(c, 0)
+
+
+def test_rows_starting_late_get_non_negative_bases():
+    table = comb_pack([{0: 1, 1: 1}, {5: 2, 6: 2}], [0, 0])
+    assert min(table["base"]) >= 0
+    assert decode(table, 1, 5) == 2 and decode(table, 1, 0) == 0
+
+
+def test_compact_ll1_decodes_to_dense_table():
+    compiled = CompiledLL1(ll1_analysis("E -> T E'\nE' -> + T E' | epsilon\nT -> F T'\nT' -> * F T' | epsilon\nF -> ( E ) | id"))
+    table = compact_ll1(compiled)["table"]
+    for r, row in enumerate(compiled.rows):
+        for c, pid in enumerate(row):
+            # Error cells may decode to the row's default production.
+            assert decode(table, r, c) == pid if pid >= 0 else decode(table, r, c) in (-1, table["default"][r])
+
+
+@pytest.mark.parametrize("kind", ["slr", "lalr"])
+def test_compact_lr_decodes_to_dense_tables(kind):
+    compiled = CompiledLR(lr_analysis("E -> E + T | T\nT -> T * F | F\nF -> ( E ) | id", kind))
+    packed = compact_lr(compiled)
+    for s, row in enumerate(compiled.action):
+        for t, code in enumerate(row):
+            got = decode(packed["action"], s, t)
+            assert got == code if code else got in (0, packed["action"]["default"][s])
+    for s, row in enumerate(compiled.goto):
+        for nt, target in enumerate(row):
+            if target >= 0: assert decode(packed["goto"], nt, s) == target